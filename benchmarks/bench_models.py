@@ -0,0 +1,51 @@
+"""基准测试使用的消息定义，运行基准测试前会生成并编译对应的 proto 文件"""
+
+import enum
+
+from pydantic import BaseModel
+
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+
+@pb.enum
+class Status(enum.IntEnum):
+    ACTIVE = 1
+    BLOCKED = 2
+
+
+@pb.message
+class Address(BaseModel):
+    city: str
+    zip: str
+
+
+@pb.message
+class User(BaseModel):
+    id: int
+    name: str
+    email: str
+    score: float
+    status: Status
+    tags: list[str]
+    address: Address
+
+
+def make_users(n: int) -> list[User]:
+    return [
+        User(
+            id=i,
+            name=f"user{i}",
+            email=f"user{i}@example.com",
+            score=i / 4,
+            status=Status.ACTIVE,
+            tags=["a", "b"],
+            address=Address(city="city", zip=str(i)),
+        )
+        for i in range(n)
+    ]
+
+
+pb.generate()
+pb.compile()
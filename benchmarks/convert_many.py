@@ -0,0 +1,70 @@
+"""逐个转换和 convert_many_* 批量转换的吞吐量对比
+
+    python benchmarks/convert_many.py [-n 100000] [--workers 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_models import User, make_users  # noqa: E402
+
+from pybantic.convert import (  # noqa: E402
+    convert_from_protobuf,
+    convert_many_from_protobuf,
+    convert_many_to_protobuf,
+    convert_to_protobuf,
+)
+
+
+def measure(label: str, n: int, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:45s} {elapsed * 1000:8.0f} ms {n / elapsed:10.0f} msg/s")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    n = args.n
+    users = make_users(n)
+    messages = measure(
+        "convert_to_protobuf (loop)", n, lambda: [convert_to_protobuf(u) for u in users]
+    )
+    measure("convert_many_to_protobuf", n, lambda: convert_many_to_protobuf(users))
+    measure(
+        "convert_from_protobuf (loop)",
+        n,
+        lambda: [convert_from_protobuf(User, m) for m in messages],
+    )
+    measure(
+        "convert_many_from_protobuf",
+        n,
+        lambda: convert_many_from_protobuf(User, messages),
+    )
+    payloads = [message.SerializeToString() for message in messages]
+    measure(
+        "convert_many_from_protobuf (bytes)",
+        n,
+        lambda: convert_many_from_protobuf(User, payloads),
+    )
+    if args.workers:
+        with ProcessPoolExecutor(args.workers) as executor:
+            measure(
+                f"convert_many_from_protobuf (bytes, {args.workers} procs)",
+                n,
+                lambda: convert_many_from_protobuf(User, payloads, executor=executor),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""检查运行路径的导入：不能加载构建期的依赖，并报告在全新解释器中的导入耗时
+
+    python benchmarks/imports.py            # 违反时退出码为 1
+    python benchmarks/imports.py --repeat 9
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# 服务端、客户端和转换等运行路径上的模块
+RUNTIME_MODULES = (
+    "pybantic.convert",
+    "pybantic.client",
+    "pybantic.main",
+    "pybantic.inprocess",
+    "pybantic.cli",
+)
+
+# 只在生成和编译 proto 时需要的模块，以及只在采样时才需要的模块
+FORBIDDEN_MODULES = (
+    "grpc_tools.command",
+    "grpc_tools.protoc",
+    "jinja2",
+    "pybantic.render",
+    "pybantic._templates",
+    "pstats",
+    "tracemalloc",
+    "google.protobuf.text_format",
+)
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "forbidden": [name for name in {forbidden!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(module: str) -> dict:
+    """在全新的解释器中导入 module"""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, forbidden=FORBIDDEN_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    for module in RUNTIME_MODULES:
+        results = [probe(module) for _ in range(args.repeat)]
+        median = statistics.median(result["seconds"] for result in results)
+        forbidden = results[0]["forbidden"]
+        if forbidden:
+            failures.append(module)
+        print(
+            f"{module:24s} {median * 1000:8.1f}ms"
+            + (f"  imports {', '.join(forbidden)}" if forbidden else "")
+        )
+    if failures:
+        print(f"\n{len(failures)} module(s) import build-time dependencies")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
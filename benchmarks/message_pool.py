@@ -0,0 +1,53 @@
+"""编码热路径上使用 MessagePool 前后的 pb2 分配次数和耗时
+
+    python benchmarks/message_pool.py [-n 200000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_models import make_users  # noqa: E402
+
+from pybantic.convert import convert_to_protobuf  # noqa: E402
+from pybantic.pool import MessagePool  # noqa: E402
+
+
+def encode_loop(users, pool=None) -> None:
+    for user in users:
+        message = convert_to_protobuf(user, pool=pool)
+        message.SerializeToString()
+        if pool is not None:
+            pool.release(message)
+
+
+def measure(label: str, users, pool=None) -> None:
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    started = time.perf_counter()
+    encode_loop(users, pool)
+    elapsed = time.perf_counter() - started
+    collections = gc.get_stats()[0]["collections"] - collections
+    allocations = len(users) if pool is None else pool.stats.allocations
+    print(
+        f"{label:12s} {elapsed * 1000:8.0f} ms {len(users) / elapsed:10.0f} msg/s "
+        f"pb2 allocations {allocations:8d} gen0 collections {collections:6d}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    users = make_users(args.n)
+    measure("no pool", users)
+    measure("pool", users, MessagePool())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""pybantic 的基准测试：消息转换、proto 生成和编译、本地回环的 unary 和 streaming RPC、冷启动导入
+
+    python benchmarks/run.py                              # 运行全部基准测试
+    python benchmarks/run.py -k convert.flat              # 只运行名字包含 convert.flat 的
+    python benchmarks/run.py -o result.json               # 结果写入 JSON 文件
+    python benchmarks/run.py --save-baseline baseline.json
+    python benchmarks/run.py --baseline baseline.json     # 和基线比较，变慢超过阈值时退出码为 1
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import textwrap
+import time
+import timeit
+from typing import Callable, Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import grpc  # noqa: E402
+
+import shapes  # noqa: E402
+from imports import RUNTIME_MODULES, probe  # noqa: E402
+from pybantic.build import GENERATED_SUFFIXES  # noqa: E402
+from pybantic.client import gRPCClient  # noqa: E402
+from pybantic.convert import convert_from_protobuf, convert_to_protobuf  # noqa: E402
+
+STREAM_SERVICE = "benchmarks.Stream"
+STREAM_LENGTH = 1000
+
+# (名字, 每次调用处理的操作数, 准备函数)，准备函数返回被计时的无参函数和清理函数
+Case = tuple[str, int, Callable[[], tuple[Callable[[], object], Callable[[], None]]]]
+
+
+def _noop() -> None:
+    pass
+
+
+def convert_cases() -> Iterator[Case]:
+    for name, (model, factory) in shapes.SHAPES.items():
+        value = factory()
+        message = convert_to_protobuf(value)
+        yield (
+            f"convert.{name}.encode",
+            1,
+            lambda value=value: (lambda: convert_to_protobuf(value), _noop),
+        )
+        yield (
+            f"convert.{name}.decode",
+            1,
+            lambda model=model, message=message: (
+                lambda: convert_from_protobuf(model, message),
+                _noop,
+            ),
+        )
+
+
+SYNTHETIC_SCHEMA = '''
+import enum
+from pydantic import BaseModel, create_model
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+@pb.enum
+class Kind(enum.IntEnum):
+    ONE = 1
+    TWO = 2
+
+_previous = None
+for _i in range({messages}):
+    _fields = {{f"f{{_j}}": (int if _j % 3 else str, ...) for _j in range({fields})}}
+    _fields["kind"] = (Kind, Kind.ONE)
+    _fields["tags"] = (list[str], [])
+    if _previous is not None:
+        _fields["child"] = (_previous, None)
+        _fields["children"] = (dict[str, _previous], {{}})
+    _previous = pb.message(create_model(f"Message{{_i}}", __module__=__name__, **_fields))
+'''
+
+
+def _remove_outputs(directory: str, suffixes: tuple[str, ...]) -> None:
+    for name in os.listdir(directory):
+        if name.endswith(suffixes):
+            os.remove(os.path.join(directory, name))
+
+
+def schema_cases(messages: int, fields: int) -> Iterator[Case]:
+    """在临时目录中生成 messages 个消息、每个 fields 个字段的 schema
+
+    generate 跳过内容未变化的 proto，compile 只编译过期的 proto，
+    所以每次计时的调用都先删除上一次的输出，测量的是完整的生成和编译。
+    """
+
+    def setup(step: str):
+        directory = tempfile.mkdtemp(prefix="pybantic-bench-")
+        module_name = f"synthetic_{step}_{int(time.time() * 1e6)}"
+        with open(os.path.join(directory, f"{module_name}.py"), "w") as f:
+            f.write(
+                textwrap.dedent(SYNTHETIC_SCHEMA).format(messages=messages, fields=fields)
+            )
+        sys.path.insert(0, directory)
+        module = importlib.import_module(module_name)
+
+        def teardown():
+            sys.path.remove(directory)
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if step == "compile":
+            module.pb.generate()
+
+            def compile_all():
+                _remove_outputs(directory, GENERATED_SUFFIXES)
+                return module.pb.compile()
+
+            return compile_all, teardown
+
+        def generate_all():
+            _remove_outputs(directory, (".proto",))
+            return module.pb.generate()
+
+        return generate_all, teardown
+
+    yield f"schema.generate.{messages}x{fields}", 1, lambda: setup("generate")
+    yield f"schema.compile.{messages}x{fields}", 1, lambda: setup("compile")
+
+
+def _stream_echo(request_iterator, context):
+    for request in request_iterator:
+        value = convert_from_protobuf(shapes.Flat, request)
+        yield convert_to_protobuf(value)
+
+
+def rpc_cases() -> Iterator[Case]:
+    """在本地回环端口上启动 Pybantic 服务端，测量完整的往返"""
+    state: dict = {}
+
+    def start() -> str:
+        if "target" not in state:
+            flat_pb = type(convert_to_protobuf(shapes.make_flat()))
+            # Pybantic 暂不支持 streaming 方法，这里直接在同一个 grpc.Server 上
+            # 注册 stream-stream 处理器，每条消息都经过 convert_*_protobuf
+            shapes.pb.server.add_generic_rpc_handlers(
+                (
+                    grpc.method_handlers_generic_handler(
+                        STREAM_SERVICE,
+                        {
+                            "Echo": grpc.stream_stream_rpc_method_handler(
+                                _stream_echo,
+                                request_deserializer=flat_pb.FromString,
+                                response_serializer=flat_pb.SerializeToString,
+                            )
+                        },
+                    ),
+                )
+            )
+            shapes.pb._register_available_services()
+            port = shapes.pb.server.add_insecure_port("127.0.0.1:0")
+            shapes.pb.server.start()
+            state["target"] = f"127.0.0.1:{port}"
+            state["flat_pb"] = flat_pb
+        return state["target"]
+
+    def unary(method: str, request):
+        def setup():
+            client = gRPCClient(shapes.BenchService, start())
+            call = getattr(client, method)
+            call(request)
+            return (lambda: call(request)), client.close
+
+        return setup
+
+    def stream():
+        channel = grpc.insecure_channel(start())
+        flat_pb = state["flat_pb"]
+        call = channel.stream_stream(
+            f"/{STREAM_SERVICE}/Echo",
+            request_serializer=flat_pb.SerializeToString,
+            response_deserializer=flat_pb.FromString,
+        )
+        requests = [shapes.make_flat(i) for i in range(STREAM_LENGTH)]
+
+        def run():
+            responses = call(convert_to_protobuf(request) for request in requests)
+            for response in responses:
+                convert_from_protobuf(shapes.Flat, response)
+
+        return run, channel.close
+
+    yield "rpc.unary.flat", 1, unary("echo", shapes.make_flat())
+    yield "rpc.unary.large_repeated", 1, unary(
+        "echo_large", shapes.make_large_repeated()
+    )
+    yield f"rpc.stream.flat.x{STREAM_LENGTH}", STREAM_LENGTH, stream
+
+
+def import_cases() -> Iterator[Case]:
+    """在全新的解释器中导入运行路径上的模块，计时包括解释器的启动"""
+    for module in RUNTIME_MODULES:
+
+        def setup(module=module):
+            forbidden = probe(module)["forbidden"]
+            if forbidden:
+                raise SystemExit(f"{module} imports {', '.join(forbidden)}")
+            return (lambda: probe(module)), _noop
+
+        yield f"import.{module}", 1, setup
+
+
+def measure(
+    func: Callable[[], object], ops: int, repeat: int, min_time: float
+) -> dict[str, float]:
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+    # 每轮的单次耗时，取中位数减少噪声的影响
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    median = statistics.median(samples)
+    return {
+        "median_s": median,
+        "min_s": min(samples),
+        "max_s": max(samples),
+        "ops_per_s": ops / median,
+        "ops_per_call": ops,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def compare(
+    results: dict[str, dict], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    """返回比基线慢超过 threshold 的基准测试名"""
+    regressions = []
+    print(f"\n{'benchmark':42s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:42s} {'-':>12s} {result['median_s'] * 1e6:10.1f}us {'new':>8s}")
+            continue
+        change = result["median_s"] / base["median_s"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:42s} {base['median_s'] * 1e6:10.1f}us "
+            f"{result['median_s'] * 1e6:10.1f}us {change:+7.1%}{flag}"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", "--filter", default="", help="只运行名字包含该字符串的")
+    parser.add_argument("-o", "--output", help="结果写入的 JSON 文件")
+    parser.add_argument("--baseline", help="用于比较的基线 JSON 文件")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="比基线慢多少算退化，默认 25%%"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮至少运行的秒数")
+    parser.add_argument("--schema-messages", type=int, default=200)
+    parser.add_argument("--schema-fields", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = [
+        *convert_cases(),
+        *schema_cases(args.schema_messages, args.schema_fields),
+        *rpc_cases(),
+        *import_cases(),
+    ]
+    results: dict[str, dict] = {}
+    for name, ops, setup in cases:
+        if args.filter not in name:
+            continue
+        func, teardown = setup()
+        try:
+            # 生成和编译 schema、启动解释器都很慢，不需要凑够 min_time
+            if name.startswith(("schema.", "import.")):
+                result = measure(func, ops, repeat=min(args.repeat, 3), min_time=0)
+            else:
+                result = measure(func, ops, args.repeat, args.min_time)
+        finally:
+            teardown()
+        results[name] = result
+        print(
+            f"{name:42s} {result['median_s'] * 1e6:12.1f}us "
+            f"{result['ops_per_s']:12.0f} ops/s"
+        )
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""基准测试使用的各种形状的消息：扁平、深层嵌套、宽、大 repeated、map 和 oneof"""
+
+import enum
+from typing import Union
+
+from pydantic import BaseModel, create_model
+
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+DEPTH = 8
+WIDTH = 100
+
+
+@pb.enum
+class Color(enum.IntEnum):
+    RED = 1
+    GREEN = 2
+
+
+@pb.message
+class Flat(BaseModel):
+    id: int
+    name: str
+    score: float
+    active: bool
+    color: Color
+
+
+@pb.message
+class Leaf(BaseModel):
+    value: int
+
+
+# Level0 -> Level1 -> ... -> Leaf
+_child: type[BaseModel] = Leaf
+for _level in reversed(range(DEPTH)):
+    _child = pb.message(
+        create_model(f"Level{_level}", __module__=__name__, child=(_child, ...))
+    )
+    globals()[_child.__name__] = _child
+Deep = _child
+
+Wide = pb.message(
+    create_model(
+        "Wide",
+        __module__=__name__,
+        **{f"field{i}": (str if i % 2 else int, ...) for i in range(WIDTH)},
+    )
+)
+
+
+@pb.message
+class LargeRepeated(BaseModel):
+    numbers: list[int]
+    items: list[Flat]
+
+
+@pb.message
+class Maps(BaseModel):
+    counts: dict[str, int]
+    items: dict[str, Flat]
+
+
+@pb.message
+class Oneofs(BaseModel):
+    first: Union[Flat, Leaf, str]
+    second: Union[int, str, Color, None] = None
+
+
+@pb.service
+class BenchService:
+    @pb.expose
+    def echo(self, request: Flat) -> Flat:
+        return request
+
+    @pb.expose
+    def echo_large(self, request: LargeRepeated) -> LargeRepeated:
+        return request
+
+
+def make_flat(i: int = 0) -> Flat:
+    return Flat(id=i, name=f"name{i}", score=i / 4, active=True, color=Color.GREEN)
+
+
+def make_deep() -> BaseModel:
+    value: BaseModel = Leaf(value=1)
+    for level in reversed(range(DEPTH)):
+        value = globals()[f"Level{level}"](child=value)
+    return value
+
+
+def make_wide() -> BaseModel:
+    return Wide(**{f"field{i}": f"v{i}" if i % 2 else i for i in range(WIDTH)})
+
+
+def make_large_repeated(n: int = 1000) -> LargeRepeated:
+    return LargeRepeated(
+        numbers=list(range(n * 10)), items=[make_flat(i) for i in range(n)]
+    )
+
+
+def make_maps(n: int = 1000) -> Maps:
+    return Maps(
+        counts={f"k{i}": i for i in range(n)},
+        items={f"k{i}": make_flat(i) for i in range(n)},
+    )
+
+
+def make_oneofs() -> Oneofs:
+    return Oneofs(first=make_flat(), second=Color.RED)
+
+
+SHAPES = {
+    "flat": (Flat, make_flat),
+    "deep": (Deep, make_deep),
+    "wide": (Wide, make_wide),
+    "large_repeated": (LargeRepeated, make_large_repeated),
+    "maps": (Maps, make_maps),
+    "oneofs": (Oneofs, make_oneofs),
+}
+
+pb.generate()
+pb.compile()
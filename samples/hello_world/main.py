@@ -1,10 +1,12 @@
 import enum
+import os
 from pydantic import BaseModel
 
 from pybantic.convert import convert_to_protobuf, convert_from_protobuf
 from pybantic.main import Pybantic
 
-pb = Pybantic()
+# proto 由 `pybantic build main -o build` 预先生成和编译，运行时只检查清单
+pb = Pybantic(build_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "build"))
 
 
 @pb.message
@@ -32,9 +34,5 @@ class HelloService:
         return AResponse(message=f"Hello, {request.name}!", enum=AEnum.A)
 
 
-pb.generate()
-pb.compile()
-
-
 if __name__ == "__main__":
     pb.run()
@@ -1,3 +1,4 @@
+import functools
 import importlib
 import os
 import typing
@@ -33,57 +34,68 @@ class ElementType(enum.StrEnum):
     Enum: str = "Enum"
 
 
+@functools.cache
+def _module_origin(module: str) -> str | None:
+    """模块的源文件，同一个模块只查找一次"""
+    spec = importlib.util.find_spec(module)
+    return spec.origin if spec else None
+
+
+@functools.cache
+def _is_user_defined(user_module: str) -> bool:
+    import __main__
+
+    main_path = os.path.dirname(os.path.abspath(__main__.__file__))
+    user_module_origin = _module_origin(user_module)
+    if not user_module_origin:
+        return False
+    user_path = os.path.dirname(os.path.abspath(user_module_origin))
+    return user_path.startswith(main_path)
+
+
 class _ElementRegistry:
     __registered_elements: typing.ClassVar[dict[str, dict[ElementType, list[T]]]] = (
         defaultdict(lambda: defaultdict(list))
     )
+    # 定义子类时只记录类和注册策略，分类和模块路径的查找在渲染前批量进行
+    __pending_elements: typing.ClassVar[list[tuple[type, str]]] = []
     __register_strategy: typing.ClassVar[typing.Literal["user", "all"]] = (  # TODO:
         "user"
     )
 
     def __init_subclass__(cls, register_strategy: str = "all", **kwargs):
         cls.__register_strategy = register_strategy
-        if _ElementRegistry in cls.__bases__ or any(
-            [issubclass(basecls, _ElementRegistry) for basecls in cls.__bases__]
-        ):
-            clsmodule = cls.__module__
-            clsname = cls.__name__
-            if cls.__register_strategy == "user" and not cls.__is_user_defined(
-                clsmodule
-            ):
-                super().__init_subclass__(**kwargs)
-                return
-            if clsname not in ElementType.__members__ and clsname not in [
+        _ElementRegistry.__pending_elements.append((cls, register_strategy))
+        super().__init_subclass__(**kwargs)
+
+    @staticmethod
+    def __resolve_pending_elements():
+        pending = _ElementRegistry.__pending_elements
+        _ElementRegistry.__pending_elements = []
+        for element, register_strategy in pending:
+            clsname = element.__name__
+            if clsname in ElementType.__members__ or clsname in [
                 "_ElementRenderer",
                 "_ElementCompiler",
             ]:
-                elder_element_type = cls.__check_elder_element_type()
-                cls.__registered_elements[clsmodule][elder_element_type].append(cls)
-        super().__init_subclass__(**kwargs)
-
-    @classmethod
-    def __check_elder_element_type(cls):
-        for basecls in cls.mro():
-            if basecls.__name__ == "Message":
-                return ElementType.Message
-            elif basecls.__name__ == "Service":
-                return ElementType.Service
-            elif basecls.__name__ == "Enum":
-                return ElementType.Enum
-        else:
-            print(basecls.__name__)
-        raise ValueError(f"{cls.__name__} is not a valid ElementType")
-
-    @classmethod
-    def __is_user_defined(cls, user_module: str):
-        import __main__
+                continue
+            clsmodule = element.__module__
+            if register_strategy == "user" and not _is_user_defined(clsmodule):
+                continue
+            element_type = _ElementRegistry.__check_elder_element_type(element)
+            _ElementRegistry.__registered_elements[clsmodule][element_type].append(
+                element
+            )
 
-        main_path = os.path.dirname(os.path.abspath(__main__.__file__))
-        user_module_spec = importlib.util.find_spec(user_module)
-        if not user_module_spec or not user_module_spec.origin:
-            return False
-        user_path = os.path.dirname(os.path.abspath(user_module_spec.origin))
-        return user_path.startswith(main_path)
+    @staticmethod
+    def __check_elder_element_type(element):
+        if issubclass(element, Message):
+            return ElementType.Message
+        if issubclass(element, Service):
+            return ElementType.Service
+        if issubclass(element, Enum):
+            return ElementType.Enum
+        raise ValueError(f"{element.__name__} is not a valid ElementType")
 
 
 class _ElementRenderer(_ElementRegistry):
@@ -267,16 +279,16 @@ class _ElementRenderer(_ElementRegistry):
 
     @staticmethod
     def __auto_write_protobuf(module: str, rendered_package: str) -> None:
-        spec = importlib.util.find_spec(module)
-        if spec is None:
+        target = _module_origin(module)
+        if target is None:
             raise ValueError(f"module {module} not found")
-        target = spec.origin
         target = target.replace(".py", ".proto")
         with open(target, "w") as f:
             f.write(rendered_package)
 
     @classmethod
     def __render(cls, auto_writing: bool = True):
+        cls._ElementRegistry__resolve_pending_elements()
         for (
             module,
             typed_elements,
@@ -306,10 +318,9 @@ class _ElementCompiler(_ElementRenderer):
         cls._ElementRegistry__register_strategy = compile_strategy
         cls._ElementRenderer__render(auto_writing=True)
         for module in cls._ElementRegistry__registered_elements.keys():
-            spec = importlib.util.find_spec(module)
-            if not spec:
+            target = _module_origin(module)
+            if target is None:
                 raise ValueError(f"module {module} not found")
-            target = spec.origin
             target_dir = os.path.dirname(target)
             build_package_protos(
                 package_root=target_dir,
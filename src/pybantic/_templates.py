@@ -101,8 +101,14 @@ class EnumItemTemplate(Template):
 
 class EnumTemplate(Template):
     template: str = """enum {{name}} {
+{%- if allow_alias %}
+    option allow_alias = true;
+{%- else %}
     // option allow_alias = true;
-    ENUM_UNSPECIFIED = 0; // default value
+{%- endif %}
+{%- if not has_zero %}
+    {{unspecified}} = 0; // default value
+{%- endif %}
 {%- for item in items %}
     {{item-}}
 {% endfor %}
@@ -110,6 +116,9 @@ class EnumTemplate(Template):
 
     name: str
     items: list[str]
+    unspecified: str = "ENUM_UNSPECIFIED"
+    allow_alias: bool = False
+    has_zero: bool = False
 
 
 class OneOfTemplate(Template):
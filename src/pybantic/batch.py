@@ -0,0 +1,162 @@
+from __future__ import annotations
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable
+
+from pydantic import BaseModel, create_model
+
+if TYPE_CHECKING:
+    from pybantic.main import Pybantic
+
+
+class BatchPolicy(BaseModel):
+    """客户端批量发送策略，攒够 max_batch_size 个请求或等待超过 max_delay 秒时发送"""
+
+    max_batch_size: int = 64
+    max_delay: float = 0.005
+
+
+_batch_models: dict[type[BaseModel], type[BaseModel]] = {}
+
+
+def batch_model(model: type[BaseModel], pb: Pybantic) -> type[BaseModel]:
+    """由单个请求或响应模型派生出 `{Name}Batch` 模型，并注册为消息"""
+    if model not in _batch_models:
+        batch_cls = create_model(
+            f"{model.__name__}Batch",
+            __module__=model.__module__,
+            items=(list[model], []),
+        )
+        _batch_models[model] = pb.message(batch_cls)
+    return _batch_models[model]
+
+
+def batch_method(
+    service_cls: type,
+    method: Callable,
+    request_type: type[BaseModel],
+    response_type: type[BaseModel],
+    pb: Pybantic,
+) -> Callable:
+    """为 expose(batch=True) 的方法生成 `{name}_batch` 方法，逐个调用原方法"""
+    from pybantic.service import expose
+
+    request_batch = batch_model(request_type, pb)
+    response_batch = batch_model(response_type, pb)
+
+    def handler(self, request):
+        return response_batch(
+            items=[method(self, request=item) for item in request.items]
+        )
+
+    handler.__name__ = f"{method.__name__}_batch"
+    handler.__qualname__ = f"{service_cls.__qualname__}.{handler.__name__}"
+    handler.__module__ = service_cls.__module__
+    handler.__annotations__ = {"request": request_batch, "return": response_batch}
+    return expose(handler)
+
+
+class Batcher:
+    """把同一方法的多个调用攒成一次批量 RPC，每个调用各自拿到一个 Future"""
+
+    def __init__(
+        self,
+        policy: BatchPolicy,
+        send: Callable[[list[BaseModel]], list[BaseModel]],
+    ) -> None:
+        self.policy = policy
+        self._send = send
+        self._pending: list[tuple[BaseModel, Future]] = []
+        self._deadline = 0.0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker: threading.Thread | None = None
+
+    def submit(self, request: BaseModel) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            self._pending.append((request, future))
+            if len(self._pending) >= self.policy.max_batch_size:
+                batch = self._take()
+            else:
+                batch = None
+                if len(self._pending) == 1:
+                    self._deadline = time.monotonic() + self.policy.max_delay
+                    self._ensure_worker()
+                    self._cond.notify()
+        # 攒满时由提交请求的线程直接发送
+        if batch:
+            self._flush(batch)
+        return future
+
+    def flush(self) -> None:
+        with self._cond:
+            batch = self._take()
+        if batch:
+            self._flush(batch)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+    def _take(self) -> list[tuple[BaseModel, Future]]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if not self._pending:
+                        self._cond.wait()
+                        continue
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                batch = self._take()
+            self._flush(batch)
+
+    def _flush(self, batch: list[tuple[BaseModel, Future]]) -> None:
+        try:
+            responses = self._send([request for request, _ in batch])
+            if len(responses) != len(batch):
+                raise RuntimeError(
+                    f"Batch returned {len(responses)} items for {len(batch)} requests"
+                )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            future.set_result(response)
+
+
+def batch_send(client: Any, name: str) -> Callable[[list[BaseModel]], list[BaseModel]]:
+    """通过客户端的 `{name}_batch` 方法发送一批请求"""
+    batch_name = f"{name}_batch"
+    method = getattr(client.service, batch_name, None)
+    if method is None:
+        raise AttributeError(
+            f"服务 {client.service.__name__} 没有批量方法 {batch_name}，"
+            f"请使用 @expose(batch=True)"
+        )
+    request_batch = method.__annotations__["request"]
+
+    def send(requests: list[BaseModel]) -> list[BaseModel]:
+        response = getattr(client, batch_name)(request=request_batch(items=requests))
+        return response.items
+
+    return send
@@ -0,0 +1,267 @@
+import importlib
+import itertools
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图，相对误差约为 precision，记录和合并都是 O(1)"""
+
+    def __init__(self, precision: float = 0.01) -> None:
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.counts: dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        # 以纳秒为单位取对数分桶，1 纳秒以下的值都落在第一个桶
+        nanos = max(seconds * 1e9, 1.0)
+        self.counts[int(math.log(nanos) / self._log_base)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """第 q 百分位所在桶的上界，不超过记录到的最大值"""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(math.exp((index + 1) * self._log_base) / 1e9, self.max)
+        return self.max
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            **{f"p{q:g}": self.percentile(q) for q in PERCENTILES},
+        }
+
+
+class BenchConfig(BaseModel):
+    """压测配置
+
+    rps 为 None 时是闭环压测：每个并发在上一个请求返回后立即发出下一个。
+    指定 rps 时是开环压测：请求按固定速率排定发出时间，延迟从排定的时间开始计算，
+    服务端变慢导致请求积压时，排队的时间也计入延迟，不会因为协同遗漏而低估尾延迟。
+    """
+
+    connections: int = 1
+    concurrency: Optional[int] = None
+    duration: float = 10.0
+    requests: Optional[int] = None
+    rps: Optional[float] = None
+    warmup: float = 1.0
+
+
+class BenchResult(BaseModel):
+    mode: str
+    elapsed: float
+    completed: int
+    errors: dict[str, int]
+    throughput: float
+    latency: dict[str, int | float]
+
+
+def _error_name(error: BaseException) -> str:
+    # gRPCClient 把 grpc.RpcError 包装在 RuntimeError 中
+    cause = error.__cause__ or error
+    code = getattr(cause, "code", None)
+    if callable(code):
+        return str(code().name)
+    return type(cause).__name__
+
+
+def run_bench(
+    calls: list[Callable[[Any], Any]],
+    make_request: Callable[[], Any],
+    config: BenchConfig,
+) -> BenchResult:
+    """用 calls（每个连接一个）压测，每个并发各自记录直方图，结束后合并"""
+    concurrency = config.concurrency or config.connections
+    if config.rps is not None:
+        # 开环压测需要足够的并发容纳积压的请求
+        concurrency = config.concurrency or max(config.connections, 64)
+
+    if config.warmup > 0:
+        _closed_loop(calls, make_request, concurrency, config.warmup, None)
+
+    if config.rps is None:
+        histograms, errors, elapsed = _closed_loop(
+            calls, make_request, concurrency, config.duration, config.requests
+        )
+        mode = "closed"
+    else:
+        histograms, errors, elapsed = _open_loop(
+            calls, make_request, concurrency, config
+        )
+        mode = "open"
+
+    histogram = LatencyHistogram()
+    for item in histograms:
+        histogram.merge(item)
+    return BenchResult(
+        mode=mode,
+        elapsed=elapsed,
+        completed=histogram.count,
+        errors=dict(errors),
+        throughput=histogram.count / elapsed if elapsed else 0.0,
+        latency=histogram.as_dict(),
+    )
+
+
+def _run_workers(concurrency: int, worker: Callable[[int], None]) -> None:
+    threads = [
+        threading.Thread(target=worker, args=(index,), daemon=True)
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _closed_loop(
+    calls: list[Callable[[Any], Any]],
+    make_request: Callable[[], Any],
+    concurrency: int,
+    duration: float,
+    requests: Optional[int],
+) -> tuple[list[LatencyHistogram], Counter, float]:
+    histograms = [LatencyHistogram() for _ in range(concurrency)]
+    errors = [Counter() for _ in range(concurrency)]
+    tickets = itertools.count()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def worker(index: int) -> None:
+        call, histogram = calls[index % len(calls)], histograms[index]
+        worker_errors = errors[index]
+        while True:
+            if requests is not None:
+                if next(tickets) >= requests:
+                    return
+            elif time.perf_counter() >= deadline:
+                return
+            try:
+                # 构造请求失败也计为错误，不让工作线程静默退出
+                request = make_request()
+                sent = time.perf_counter()
+                call(request)
+            except Exception as e:
+                worker_errors[_error_name(e)] += 1
+                continue
+            histogram.record(time.perf_counter() - sent)
+
+    _run_workers(concurrency, worker)
+    return histograms, sum(errors, Counter()), time.perf_counter() - started
+
+
+def _open_loop(
+    calls: list[Callable[[Any], Any]],
+    make_request: Callable[[], Any],
+    concurrency: int,
+    config: BenchConfig,
+) -> tuple[list[LatencyHistogram], Counter, float]:
+    histograms = [LatencyHistogram() for _ in range(concurrency)]
+    errors = [Counter() for _ in range(concurrency)]
+    interval = 1 / config.rps
+    total = (
+        config.requests
+        if config.requests is not None
+        else int(config.duration * config.rps)
+    )
+    tickets = itertools.count()
+    started = time.perf_counter()
+
+    def worker(index: int) -> None:
+        call, histogram = calls[index % len(calls)], histograms[index]
+        worker_errors = errors[index]
+        while True:
+            ticket = next(tickets)
+            if ticket >= total:
+                return
+            # 第 ticket 个请求排定的发出时间，延迟从这里开始计算
+            scheduled = started + ticket * interval
+            try:
+                request = make_request()
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                call(request)
+            except Exception as e:
+                worker_errors[_error_name(e)] += 1
+                continue
+            histogram.record(time.perf_counter() - scheduled)
+
+    _run_workers(concurrency, worker)
+    return histograms, sum(errors, Counter()), time.perf_counter() - started
+
+
+def load_object(spec: str) -> Any:
+    """加载 `module:attr.attr` 形式指定的对象，当前目录加入 sys.path"""
+    if "" not in sys.path:
+        sys.path.insert(0, "")
+    module_name, _, attr_path = spec.partition(":")
+    obj = importlib.import_module(module_name)
+    for attr in filter(None, attr_path.split(".")):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def load_sample(path: str, request_type: type[BaseModel]) -> BaseModel:
+    """读取请求样本，.json 为请求模型的 JSON，其他为序列化后的 protobuf"""
+    from pybantic.convert import _message_class, convert_from_protobuf
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".json"):
+        return request_type.model_validate(json.loads(data))
+    return convert_from_protobuf(request_type, _message_class(request_type).FromString(data))
+
+
+def format_result(result: BenchResult) -> str:
+    latency = result.latency
+    lines = [
+        "mode        "
+        + (result.mode if result.mode == "replay" else f"{result.mode}-loop"),
+        f"elapsed     {result.elapsed:.2f}s",
+        f"completed   {result.completed}",
+        f"errors      {sum(result.errors.values())}"
+        + (f" {result.errors}" if result.errors else ""),
+        f"throughput  {result.throughput:.1f} req/s",
+        "latency     "
+        + "  ".join(
+            f"{name}={latency[name] * 1000:.3f}ms"
+            for name in ("min", "mean", *(f"p{q:g}" for q in PERCENTILES), "max")
+        ),
+    ]
+    return "\n".join(lines)
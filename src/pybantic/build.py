@@ -0,0 +1,198 @@
+from __future__ import annotations
+import hashlib
+import inspect
+import json
+import os
+import re
+import sys
+import typing
+from typing import TYPE_CHECKING, Any, Iterable
+
+from pybantic.enums import enum_numbers
+from pybantic.sources import package_name, source_package
+from pybantic.types import is_enum_type, is_message_type, is_method_type
+
+if TYPE_CHECKING:
+    from pybantic.main import Pybantic
+
+MANIFEST_NAME = "pybantic.manifest.json"
+# schema 指纹的格式变化时递增，旧的构建产物需要重新构建
+MANIFEST_VERSION = 1
+# protoc 为每个 proto 生成的文件
+GENERATED_SUFFIXES = ("_pb2.py", "_pb2.pyi", "_pb2_grpc.py")
+
+_PROTO_IMPORT = re.compile(r'^import\s+(?:public\s+)?"([^"]+)"\s*;', re.M)
+
+
+def _type_name(annotation: Any) -> str:
+    """类型的稳定名字，不包含对象地址等每次运行都会变化的内容"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Annotated:
+        return _type_name(typing.get_args(annotation)[0])
+    if origin is not None:
+        args = ", ".join(_type_name(arg) for arg in typing.get_args(annotation))
+        return f"{_type_name(origin)}[{args}]"
+    if is_message_type(annotation) or is_enum_type(annotation):
+        # 以 proto package（源文件名）限定，作为 __main__ 运行时名字也不变
+        return f"{source_package(annotation)}.{annotation.__qualname__}"
+    if isinstance(annotation, type):
+        return f"{annotation.__module__}.{annotation.__qualname__}"
+    return repr(annotation)
+
+
+def _describe(element_type: str, element: Any) -> list:
+    if element_type == "message":
+        return [
+            (name, _type_name(info.annotation))
+            for name, info in element.__pydantic_fields__.items()
+        ]
+    if element_type == "enum":
+        return [
+            (name, enum_numbers(element)[member])
+            for name, member in element.__members__.items()
+        ]
+    if element_type == "service":
+        methods = []
+        for name, method in inspect.getmembers(element, inspect.isfunction):
+            if is_method_type(method):
+                annotations = dict(inspect.get_annotations(method))
+                response = annotations.pop("return")
+                request = annotations.popitem()[1]
+                methods.append((name, _type_name(request), _type_name(response)))
+        return methods
+    raise ValueError(f"Unsupported element type: {element_type}")
+
+
+def schema_fingerprints(pb: Pybantic) -> dict[str, str]:
+    """每个 proto package（即注册元素所在的模块）的 schema 指纹
+
+    指纹只取决于消息的字段名和类型、枚举的成员和编号以及服务的方法签名，
+    计算时不需要渲染 proto，也不需要 jinja2 和 protoc。
+    """
+    fingerprints = {}
+    for file_path, elements in pb.registry.items():
+        description = [
+            (element_type, element.__name__, _describe(element_type, element))
+            for element_type in sorted(elements)
+            for element in elements[element_type]
+        ]
+        payload = json.dumps([MANIFEST_VERSION, description], sort_keys=True)
+        fingerprints[package_name(file_path)] = hashlib.sha256(
+            payload.encode()
+        ).hexdigest()
+    return fingerprints
+
+
+def proto_imports(path: str) -> list[str]:
+    with open(path) as f:
+        return _PROTO_IMPORT.findall(f.read())
+
+
+def stale_protos(directory: str) -> list[str]:
+    """directory 中需要重新编译的 proto 文件名
+
+    生成的文件缺失或比 proto 旧的 proto 需要重新编译，直接或间接导入了它们的 proto
+    也要重新编译，以便 protoc 检查对它们的引用仍然有效。
+    """
+    protos = sorted(name for name in os.listdir(directory) if name.endswith(".proto"))
+    dependents: dict[str, set[str]] = {}
+    stale = set()
+    for name in protos:
+        path = os.path.join(directory, name)
+        for imported in proto_imports(path):
+            dependents.setdefault(imported, set()).add(name)
+        modified = os.stat(path).st_mtime_ns
+        for suffix in GENERATED_SUFFIXES:
+            output = os.path.join(directory, name[: -len(".proto")] + suffix)
+            if not os.path.exists(output) or os.stat(output).st_mtime_ns < modified:
+                stale.add(name)
+                break
+    pending = list(stale)
+    while pending:
+        for dependent in dependents.get(pending.pop(), ()):
+            if dependent not in stale:
+                stale.add(dependent)
+                pending.append(dependent)
+    return sorted(stale)
+
+
+def compile_protos(directory: str, strict: bool = False) -> list[str]:
+    """只编译 directory 中过期的 proto，返回编译过的文件名"""
+    from importlib import resources
+
+    from grpc_tools import protoc
+
+    well_known_protos = str((resources.files("grpc_tools") / "_proto").resolve())
+    compiled = stale_protos(directory)
+    for name in compiled:
+        command = [
+            "grpc_tools.protoc",
+            f"--proto_path={directory}",
+            f"--proto_path={well_known_protos}",
+            f"--python_out={directory}",
+            f"--pyi_out={directory}",
+            f"--grpc_python_out={directory}",
+            os.path.join(directory, name),
+        ]
+        if protoc.main(command) != 0:
+            if strict:
+                raise RuntimeError(f"failed to compile {name}")
+            sys.stderr.write(f"warning: failed to compile {name}\n")
+    return compiled
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build(pbs: Iterable[Pybantic], output_dir: str) -> dict:
+    """生成并编译所有 proto 到 output_dir，写入清单，返回清单的内容"""
+    os.makedirs(output_dir, exist_ok=True)
+    packages: dict[str, dict] = {}
+    pbs = list({id(pb): pb for pb in pbs}.values())
+    for pb in pbs:
+        pb.generate(output_dir)
+        for name, fingerprint in schema_fingerprints(pb).items():
+            packages[name] = {"schema": fingerprint, "files": {}}
+    # 所有 proto 都生成之后再编译，output_dir 中的 proto 只编译一次
+    if pbs:
+        pbs[0].compile(output_dir)
+    for name, package in packages.items():
+        for suffix in (".proto", *GENERATED_SUFFIXES):
+            path = os.path.join(output_dir, f"{name}{suffix}")
+            if os.path.exists(path):
+                package["files"][f"{name}{suffix}"] = _file_hash(path)
+    manifest = {"version": MANIFEST_VERSION, "packages": packages}
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def verify_build(pb: Pybantic, build_dir: str) -> None:
+    """检查 build_dir 中的构建产物和当前的 schema 一致，并把 build_dir 加入 sys.path
+
+    只比较清单中的指纹，不重新生成和编译；不一致时抛出 RuntimeError。
+    """
+    path = os.path.join(build_dir, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise RuntimeError(f"{path} not found, run `pybantic build` first") from None
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise RuntimeError(f"{path} was written by another pybantic version, rebuild it")
+    packages = manifest.get("packages", {})
+    stale = [
+        name
+        for name, fingerprint in schema_fingerprints(pb).items()
+        if packages.get(name, {}).get("schema") != fingerprint
+    ]
+    if stale:
+        raise RuntimeError(
+            f"schema of {', '.join(stale)} changed since the last build, "
+            "run `pybantic build` again"
+        )
+    build_dir = os.path.abspath(build_dir)
+    if build_dir not in sys.path:
+        sys.path.insert(0, build_dir)
@@ -0,0 +1,283 @@
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Hashable, Iterator, Optional, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class CachePolicy(BaseModel):
+    """客户端响应缓存策略
+
+    超过 ttl 但仍在 stale_while_revalidate 之内的条目会直接返回旧值，
+    同时在后台刷新。
+    """
+
+    maxsize: int = 1024
+    ttl: float = 60.0
+    stale_while_revalidate: float = 0.0
+
+
+class CacheStats:
+    """单个缓存的命中计数"""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / total if total else 0.0
+
+    def as_dict(self) -> dict[str, int | float]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio,
+        }
+
+
+def request_key(request: BaseModel) -> str:
+    """请求模型的规范哈希，字段顺序和 dict 的插入顺序不影响结果"""
+    payload = json.dumps(
+        request.model_dump(mode="json"),
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    return f"{request.__class__.__qualname__}:{digest}"
+
+
+@functools.cache
+def _frozen_class(model: type[T]) -> type[T]:
+    return type(
+        model.__name__,
+        (model,),
+        {
+            "__module__": model.__module__,
+            "__qualname__": model.__qualname__,
+            "model_config": {**model.model_config, "frozen": True},
+        },
+    )
+
+
+def _freeze_value(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return freeze_model(value)
+    if isinstance(value, list):
+        return [_freeze_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _freeze_value(item) for key, item in value.items()}
+    return value
+
+
+def freeze_model(instance: T) -> T:
+    """返回模型的不可变副本，嵌套的模型也一并冻结
+
+    按字段掩码构造的模型缺少部分字段，所以只复制 __dict__ 中已有的字段。
+    """
+    if not isinstance(instance, BaseModel):
+        # 轻量模型没有冻结的形式，原样返回
+        return instance
+    if instance.model_config.get("frozen"):
+        return instance
+    frozen_cls = _frozen_class(instance.__class__)
+    return frozen_cls.model_construct(
+        _fields_set=instance.model_fields_set,
+        **{name: _freeze_value(value) for name, value in instance.__dict__.items()},
+    )
+
+
+class ResponseCache:
+    """带 TTL 和 stale-while-revalidate 的 LRU 缓存"""
+
+    def __init__(self, policy: CachePolicy) -> None:
+        self.policy = policy
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._refreshing: set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age <= self.policy.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats.incr("hits")
+                    return value
+                if age <= self.policy.ttl + self.policy.stale_while_revalidate:
+                    self._entries.move_to_end(key)
+                    self.stats.incr("stale_hits")
+                    self._revalidate(key, loader)
+                    return value
+
+        self.stats.incr("misses")
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.policy.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _revalidate(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        # 调用方已持有 self._lock
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.put(key, loader())
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class DecodeCache:
+    """嵌套消息的解码缓存
+
+    以 (模型, 子消息序列化字节的哈希) 为键，内容相同的子消息只解码一次，
+    解码结果冻结后在所有引用处共享。maxsize 为 None 时不限制大小，
+    适合只在单个请求内使用的缓存。
+
+    计算键需要序列化子消息，未命中时比直接解码更慢，所以：
+    - 小于 min_bytes 的子消息直接解码，不计算键；
+    - 每个模型查找 probe 次之后，命中率低于 min_hit_ratio 的模型不再使用缓存。
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 4096,
+        min_bytes: int = 64,
+        min_hit_ratio: float = 0.1,
+        probe: int = 256,
+    ) -> None:
+        self.maxsize = maxsize
+        self.min_bytes = min_bytes
+        self.min_hit_ratio = min_hit_ratio
+        self.probe = probe
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        # 模型 -> [查找次数, 命中次数]，只统计前 probe 次查找
+        self._probes: dict[type, list[int]] = {}
+        self._bypassed: set[type] = set()
+        self._lock = threading.Lock()
+
+    def accepts(self, model: type, size: int) -> bool:
+        """这个子消息是否值得计算键查找缓存"""
+        return size >= self.min_bytes and model not in self._bypassed
+
+    def _probe(self, model: type, hit: bool) -> None:
+        # 调用方持有锁
+        counts = self._probes.get(model)
+        if counts is None:
+            counts = self._probes[model] = [0, 0]
+        elif counts[0] >= self.probe:
+            return
+        counts[0] += 1
+        counts[1] += hit
+        if counts[0] == self.probe and counts[1] < self.probe * self.min_hit_ratio:
+            self._bypassed.add(model)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        model = key[0] if isinstance(key, tuple) else None
+        with self._lock:
+            value = self._entries.get(key)
+            self._probe(model, value is not None)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.stats.incr("hits")
+                return value
+
+        self.stats.incr("misses")
+        value = loader()
+        with self._lock:
+            self._entries[key] = value
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.stats.incr("evictions")
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._probes.clear()
+            self._bypassed.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_scoped_decode_cache: ContextVar[Optional[DecodeCache]] = ContextVar(
+    "pybantic_decode_cache", default=None
+)
+_global_decode_cache: Optional[DecodeCache] = None
+
+
+def message_key(model: type, payload: bytes) -> tuple[type, bytes]:
+    return model, hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def current_decode_cache() -> Optional[DecodeCache]:
+    """当前生效的解码缓存，作用域内的缓存优先于全局缓存"""
+    cache = _scoped_decode_cache.get()
+    return _global_decode_cache if cache is None else cache
+
+
+def set_decode_cache(cache: Optional[DecodeCache]) -> None:
+    """设置全局的解码缓存，传入 None 关闭"""
+    global _global_decode_cache
+    _global_decode_cache = cache
+
+
+@contextmanager
+def decode_cache(cache: Optional[DecodeCache] = None) -> Iterator[DecodeCache]:
+    """在 with 块内使用独立的解码缓存，默认每次新建一个不限大小的缓存"""
+    cache = DecodeCache(maxsize=None) if cache is None else cache
+    token = _scoped_decode_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _scoped_decode_cache.reset(token)
@@ -0,0 +1,259 @@
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import grpc
+from pydantic import BaseModel
+
+# 文件头：魔数和格式版本
+MAGIC = b"PBCAP\x00\x01\x00"
+# 每条记录：时间戳（秒）、请求字节数、方法名字节数，之后是方法名和请求的原始字节
+RECORD = struct.Struct("<dIH")
+
+
+class CapturePolicy(BaseModel):
+    """服务端请求采样录制策略
+
+    按 sample_rate 采样的请求以原始的 protobuf 字节追加到内存映射的文件中，
+    文件写满 max_bytes 后轮转为 path.1、path.2 ...，最多保留 max_files 个旧文件。
+    进程重启时接着 path 中已有的记录追加，不覆盖之前的录制。
+    """
+
+    path: str
+    sample_rate: float = 0.01
+    max_bytes: int = 64 * 1024 * 1024
+    max_files: int = 4
+
+
+class CaptureRecord(NamedTuple):
+    timestamp: float
+    method: str
+    payload: memoryview
+
+
+class CaptureWriter:
+    def __init__(self, policy: CapturePolicy) -> None:
+        self.policy = policy
+        self.records = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._offset = 0
+        self._open(resume=True)
+
+    def _open(self, resume: bool = False) -> None:
+        end = _capture_end(self.policy.path) if resume else None
+        if end is not None and end >= self.policy.max_bytes:
+            self._shift_files()
+            end = None
+        if end is None:
+            self._file = open(self.policy.path, "w+b")
+            self._file.truncate(self.policy.max_bytes)
+            self._mmap = mmap.mmap(self._file.fileno(), self.policy.max_bytes)
+            self._mmap[: len(MAGIC)] = MAGIC
+            self._offset = len(MAGIC)
+            return
+        self._file = open(self.policy.path, "r+b")
+        size = os.fstat(self._file.fileno()).st_size
+        self._file.truncate(self.policy.max_bytes)
+        self._mmap = mmap.mmap(self._file.fileno(), self.policy.max_bytes)
+        # 异常退出时最后一条记录可能只写了一半，清零后读取时在这里停下
+        tail = min(size, self.policy.max_bytes)
+        if tail > end:
+            self._mmap[end:tail] = bytes(tail - end)
+        self._offset = end
+
+    def _close(self) -> None:
+        if self._mmap is None:
+            return
+        self._mmap.flush()
+        self._mmap.close()
+        # 截掉预分配但没有用到的部分
+        self._file.truncate(self._offset)
+        self._file.close()
+        self._mmap = None
+
+    def _shift_files(self) -> None:
+        path = self.policy.path
+        for index in range(self.policy.max_files - 1, 0, -1):
+            if os.path.exists(f"{path}.{index}"):
+                os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+        if self.policy.max_files > 0:
+            os.replace(path, f"{path}.1")
+
+    def _rotate(self) -> None:
+        self._close()
+        self._shift_files()
+        self._open()
+
+    def append(self, method: str, payload: bytes) -> None:
+        name = method.encode()
+        size = RECORD.size + len(name) + len(payload)
+        if len(MAGIC) + size > self.policy.max_bytes:
+            self.dropped += 1
+            return
+        with self._lock:
+            if self._mmap is None:
+                return
+            if self._offset + size > self.policy.max_bytes:
+                self._rotate()
+            offset = self._offset
+            RECORD.pack_into(self._mmap, offset, time.time(), len(payload), len(name))
+            offset += RECORD.size
+            self._mmap[offset : offset + len(name)] = name
+            offset += len(name)
+            self._mmap[offset : offset + len(payload)] = payload
+            self._offset = offset + len(payload)
+            self.records += 1
+
+    def maybe_append(self, method: str, payload: bytes) -> None:
+        """按采样率录制，没有采中时只有一次随机数的开销"""
+        if random.random() < self.policy.sample_rate:
+            self.append(method, payload)
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+def capturing_handler(
+    handler: grpc.RpcMethodHandler, method: str, writer: CaptureWriter
+) -> grpc.RpcMethodHandler:
+    """反序列化之前录制请求的原始字节，只处理 unary 请求"""
+    deserializer = handler.request_deserializer
+    if deserializer is None or handler.request_streaming:
+        return handler
+
+    def deserialize(payload: bytes):
+        writer.maybe_append(method, payload)
+        return deserializer(payload)
+
+    return handler._replace(request_deserializer=deserialize)
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """按顺序读取录制文件，payload 是文件映射上的 memoryview，不复制数据"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            return
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[: len(MAGIC)] != MAGIC:
+        buffer.close()
+        raise ValueError(f"{path} is not a pybantic capture file")
+    view = memoryview(buffer)
+    offset, size = len(MAGIC), len(buffer)
+    while offset + RECORD.size <= size:
+        timestamp, payload_size, name_size = RECORD.unpack_from(buffer, offset)
+        # 进程异常退出时文件末尾是预分配的零
+        if timestamp == 0 and payload_size == 0 and name_size == 0:
+            break
+        offset += RECORD.size
+        method = bytes(view[offset : offset + name_size]).decode()
+        offset += name_size
+        yield CaptureRecord(timestamp, method, view[offset : offset + payload_size])
+        offset += payload_size
+
+
+def _capture_end(path: str) -> Optional[int]:
+    """已有录制文件中最后一条完整记录之后的位置，文件不存在或不是录制文件时返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer[: len(MAGIC)] != MAGIC:
+                return None
+            offset, size = len(MAGIC), len(buffer)
+            while offset + RECORD.size <= size:
+                timestamp, payload_size, name_size = RECORD.unpack_from(buffer, offset)
+                end = offset + RECORD.size + name_size + payload_size
+                if (timestamp == 0 and payload_size == 0 and name_size == 0) or end > size:
+                    break
+                offset = end
+    return offset
+
+
+def capture_files(path: str) -> list[str]:
+    """path 和它轮转出的旧文件，按从旧到新的顺序"""
+    rotated = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        rotated.append(f"{path}.{index}")
+        index += 1
+    files = rotated[::-1]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def replay(
+    records: Iterable[CaptureRecord],
+    channel: grpc.Channel,
+    speed: float = 1.0,
+    timeout: Optional[float] = None,
+):
+    """按录制时的间隔（除以 speed）重新发出请求，speed 为 0 时不等待
+
+    请求以 future 异步发出，不受服务端响应速度的影响；
+    延迟从排定的发出时间开始计算，返回 `pybantic.bench.BenchResult`。
+    """
+    from pybantic.bench import BenchResult, LatencyHistogram, _error_name
+
+    histogram = LatencyHistogram()
+    errors: Counter = Counter()
+    lock = threading.Condition()
+    outstanding = 0
+    calls: dict[str, grpc.UnaryUnaryMultiCallable] = {}
+
+    def done(future: grpc.Future, scheduled: float) -> None:
+        nonlocal outstanding
+        finished = time.perf_counter()
+        error = future.exception()
+        with lock:
+            if error is None:
+                histogram.record(finished - scheduled)
+            else:
+                errors[_error_name(error)] += 1
+            outstanding -= 1
+            lock.notify()
+
+    started = time.perf_counter()
+    first: Optional[float] = None
+    for record in records:
+        if first is None:
+            first = record.timestamp
+        scheduled = started
+        if speed > 0:
+            scheduled += (record.timestamp - first) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        call = calls.get(record.method)
+        if call is None:
+            # 不指定序列化函数，直接发送录制的原始字节
+            call = calls[record.method] = channel.unary_unary(record.method)
+        with lock:
+            outstanding += 1
+        future = call.future(bytes(record.payload), timeout=timeout)
+        future.add_done_callback(
+            lambda future, scheduled=scheduled: done(future, scheduled)
+        )
+
+    with lock:
+        lock.wait_for(lambda: outstanding == 0)
+        elapsed = time.perf_counter() - started
+        return BenchResult(
+            mode="replay",
+            elapsed=elapsed,
+            completed=histogram.count,
+            errors=dict(errors),
+            throughput=histogram.count / elapsed if elapsed else 0.0,
+            latency=histogram.as_dict(),
+        )
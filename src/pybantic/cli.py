@@ -0,0 +1,234 @@
+import argparse
+import inspect
+import json
+import os
+import sys
+from typing import Optional
+
+# 子命令用到的模块都在子命令中导入，`pybantic --help` 不需要加载 grpc 和 pydantic
+
+
+def _bench(args: argparse.Namespace) -> int:
+    import grpc
+
+    from pybantic.bench import (
+        BenchConfig,
+        format_result,
+        load_object,
+        load_sample,
+        run_bench,
+    )
+    from pybantic.client import gRPCClient
+    from pybantic.main import Pybantic
+
+    service_spec, _, method_name = args.method.rpartition(".")
+    service = load_object(service_spec)
+    method = getattr(service, method_name, None)
+    if getattr(method, "__pybantic_type__", None) != "method":
+        print(f"{args.method} is not an exposed method", file=sys.stderr)
+        return 2
+    request_type = list(inspect.signature(method).parameters.values())[1].annotation
+
+    if args.factory:
+        make_request = load_object(args.factory)
+    elif args.sample:
+        sample = load_sample(args.sample, request_type)
+        make_request = lambda: sample  # noqa: E731
+    else:
+        make_request = request_type
+    try:
+        make_request()
+    except Exception as e:
+        print(
+            f"cannot build a {request_type.__name__} request: {e}\n"
+            "use --sample or --factory to provide one",
+            file=sys.stderr,
+        )
+        return 2
+
+    target = args.target
+    if args.serve:
+        # 在当前进程中启动服务模块中的 Pybantic 服务端
+        module = sys.modules[service.__module__]
+        pb = next(
+            value for value in vars(module).values() if isinstance(value, Pybantic)
+        )
+        pb._register_available_services()
+        port = pb.server.add_insecure_port("127.0.0.1:0")
+        pb.server.start()
+        target = f"127.0.0.1:{port}"
+    if target is None:
+        print("either --target or --serve is required", file=sys.stderr)
+        return 2
+
+    clients = [
+        gRPCClient(
+            service,
+            target,
+            # 每个客户端使用独立的子通道，才是真正的 N 个连接
+            channel=grpc.insecure_channel(
+                target, options=[("grpc.use_local_subchannel_pool", 1)]
+            ),
+        )
+        for _ in range(args.connections)
+    ]
+    config = BenchConfig(
+        connections=args.connections,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        requests=args.requests,
+        rps=args.rps,
+        warmup=args.warmup,
+    )
+    try:
+        result = run_bench(
+            [getattr(client, method_name) for client in clients], make_request, config
+        )
+    finally:
+        for client in clients:
+            client.close()
+
+    if args.json:
+        print(json.dumps(result.model_dump(), indent=2))
+    else:
+        print(format_result(result))
+    return 0
+
+
+def _replay(args: argparse.Namespace) -> int:
+    import grpc
+
+    from pybantic.bench import format_result
+    from pybantic.capture import capture_files, read_capture, replay
+
+    files = [name for path in args.capture for name in capture_files(path)]
+    if not files:
+        print("no capture files found", file=sys.stderr)
+        return 2
+    methods = set(args.method or ())
+    records = (
+        record
+        for name in files
+        for record in read_capture(name)
+        if not methods or record.method in methods
+    )
+    with grpc.insecure_channel(args.target) as channel:
+        result = replay(records, channel, speed=args.speed, timeout=args.timeout)
+
+    if args.json:
+        print(json.dumps(result.model_dump(), indent=2))
+    else:
+        print(format_result(result))
+    return 0
+
+
+def _slow_calls(args: argparse.Namespace) -> int:
+    import grpc
+
+    from pybantic.slowlog import query_slow_calls
+
+    with grpc.insecure_channel(args.target) as channel:
+        entries = query_slow_calls(channel, args.method)
+
+    if args.json:
+        print(json.dumps([entry.model_dump() for entry in entries], indent=2))
+        return 0
+    for entry in entries:
+        phases = "  ".join(
+            f"{phase}={seconds * 1000:.3f}ms" for phase, seconds in entry.phases.items()
+        )
+        print(
+            f"{entry.method}  {entry.elapsed * 1000:.3f}ms  {entry.code}  {phases}  "
+            f"request={entry.request_bytes}B response={entry.response_bytes}B"
+        )
+        print(f"    {entry.request}")
+    return 0
+
+
+def _build(args: argparse.Namespace) -> int:
+    from pybantic.bench import load_object
+    from pybantic.build import MANIFEST_NAME, build
+    from pybantic.main import Pybantic
+
+    pbs = []
+    for spec in args.module:
+        module = load_object(spec)
+        pbs += [value for value in vars(module).values() if isinstance(value, Pybantic)]
+    if not pbs:
+        print("no Pybantic instance found in the given modules", file=sys.stderr)
+        return 2
+
+    manifest = build(pbs, args.output)
+    for name, package in sorted(manifest["packages"].items()):
+        print(f"{name:24s} {package['schema'][:12]}  {len(package['files'])} files")
+    print(f"wrote {os.path.join(args.output, MANIFEST_NAME)}")
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="pybantic")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser(
+        "build",
+        help="生成并编译 proto，写入清单",
+        description="导入模块，把其中 Pybantic 实例注册的所有 proto 生成并编译到输出目录，"
+        "运行时 Pybantic(build_dir=...) 只检查清单中的指纹",
+    )
+    build.add_argument("module", nargs="+", help="定义 schema 的模块，如 app.schema")
+    build.add_argument("-o", "--output", default="build", help="输出目录，默认 build")
+    build.set_defaults(func=_build)
+
+    bench = subparsers.add_parser(
+        "bench",
+        help="压测一个暴露的方法",
+        description="闭环或开环（固定 RPS）压测，报告吞吐量和 p50/p90/p99/p999 延迟",
+    )
+    bench.add_argument("method", help="module:Service.method，如 app.services:UserService.get")
+    bench.add_argument("--target", help="服务端地址，如 localhost:50051")
+    bench.add_argument("--serve", action="store_true", help="在当前进程中启动服务端")
+    requests = bench.add_mutually_exclusive_group()
+    requests.add_argument("--factory", help="module:function，每次调用返回一个请求")
+    requests.add_argument("--sample", help="请求样本，.json 或序列化后的 protobuf")
+    bench.add_argument("-c", "--connections", type=int, default=1)
+    bench.add_argument("--concurrency", type=int, help="并发数，默认等于连接数")
+    bench.add_argument("-d", "--duration", type=float, default=10.0)
+    bench.add_argument("-n", "--requests", type=int, help="总请求数，指定时忽略 --duration")
+    bench.add_argument("--rps", type=float, help="开环压测的固定速率，不指定时为闭环压测")
+    bench.add_argument("--warmup", type=float, default=1.0)
+    bench.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    bench.set_defaults(func=_bench)
+
+    replay = subparsers.add_parser(
+        "replay",
+        help="重放录制的请求",
+        description="按录制时的间隔重新发出服务端录制的请求，轮转出的旧文件一并重放",
+    )
+    replay.add_argument("capture", nargs="+", help="录制文件，即 CapturePolicy.path")
+    replay.add_argument("--target", required=True, help="服务端地址，如 localhost:50051")
+    replay.add_argument(
+        "--speed", type=float, default=1.0, help="重放速度的倍数，0 表示不等待，默认 1"
+    )
+    replay.add_argument(
+        "--method", action="append", help="只重放该方法，如 /app.UserService/get，可重复"
+    )
+    replay.add_argument("--timeout", type=float, help="每个请求的超时秒数")
+    replay.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    replay.set_defaults(func=_replay)
+
+    slow_calls = subparsers.add_parser(
+        "slow-calls",
+        help="查询服务端记录的慢调用",
+        description="通过本机的管理服务查询 Pybantic(slow_calls=...) 记录的最慢的调用",
+    )
+    slow_calls.add_argument("--target", required=True, help="服务端地址，如 localhost:50051")
+    slow_calls.add_argument("--method", help="只查询该方法，如 UserService/get")
+    slow_calls.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    slow_calls.set_defaults(func=_slow_calls)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
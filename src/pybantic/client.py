@@ -1,9 +1,40 @@
 import importlib
 import inspect
-import os
+import time
 import grpc
-from typing import Any, Optional
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Any, Callable, Iterable, Optional
+from pybantic.batch import Batcher, BatchPolicy, batch_send
+from pybantic.cache import (
+    CachePolicy,
+    ResponseCache,
+    decode_cache,
+    freeze_model,
+    request_key,
+)
 from pybantic.convert import convert_to_protobuf, convert_from_protobuf
+from pybantic.hooks import Hook, hook_chain
+from pybantic.lite import lite_model
+from pybantic.metrics import MetricsRegistry, default_registry
+from pybantic.pool import MessagePool
+from pybantic.retry import (
+    HedgingPolicy,
+    LatencyTracker,
+    RetryBudget,
+    RetryPolicy,
+    RetryStats,
+    call_with_hedging,
+    call_with_retry,
+)
+from pybantic.sources import source_package
+
+
+def _status_code(error: Exception) -> grpc.StatusCode:
+    if isinstance(error, grpc.RpcError) and callable(getattr(error, "code", None)):
+        return error.code()
+    return grpc.StatusCode.UNKNOWN
 
 
 class gRPCClient:  # 修复拼写错误
@@ -14,31 +45,72 @@ class gRPCClient:  # 修复拼写错误
         service,
         target: str,
         credentials: Optional[grpc.ChannelCredentials] = None,
+        retry_policies: Optional[dict[str, RetryPolicy | HedgingPolicy]] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        cache_policies: Optional[dict[str, CachePolicy]] = None,
+        batch_policies: Optional[dict[str, BatchPolicy]] = None,
+        channel: Optional[grpc.Channel] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        metadata_hooks: Optional[
+            list[Callable[[str, Any], Iterable[tuple[str, str]]]]
+        ] = None,
+        response_decode_cache: bool = False,
+        message_pool: Optional[MessagePool] = None,
+        hooks: Optional[list[Hook]] = None,
     ):
         """
         Args:
             service: 用 @pb.service 装饰的服务类
             target: 服务器地址 (如 'localhost:50051')
             credentials: gRPC 凭证，None 表示不安全连接
+            retry_policies: 方法名到重试策略的映射，HedgingPolicy 只能用于幂等方法
+            retry_budget: 所有方法共享的重试预算，None 表示使用默认预算
+            cache_policies: 方法名到缓存策略的映射，只应用于读取类的方法
+            batch_policies: 方法名到批量策略的映射，服务端需要用 @expose(batch=True) 暴露该方法
+            channel: 自定义的 gRPC 通道，如 InProcessChannel，传入时忽略 target 和 credentials
+            metrics: 记录调用指标的注册表，None 表示和服务端共用默认注册表
+            metadata_hooks: 以 (方法名, 请求) 调用，返回要附加到请求上的元数据，如追踪信息
+            response_decode_cache: 解码每个响应时使用独立的解码缓存，相同的子消息只解码一次
+            message_pool: 请求 message 从消息池中取得，调用结束后归还
+            hooks: 调用各阶段的回调，用于追踪和剖析
         """
         self.service = service
         self.target = target
+        self.metrics = default_registry if metrics is None else metrics
+        self.metadata_hooks = metadata_hooks or []
+        self.response_decode_cache = response_decode_cache
+        self.message_pool = message_pool
+        self.hooks = hook_chain(hooks)
+        self.retry_policies = retry_policies or {}
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retry_stats: dict[str, RetryStats] = defaultdict(RetryStats)
+        self._latencies: dict[str, LatencyTracker] = {}
+        self.caches = {
+            name: ResponseCache(policy)
+            for name, policy in (cache_policies or {}).items()
+        }
+        self.cache_stats = {name: cache.stats for name, cache in self.caches.items()}
+        self.batchers = {
+            name: Batcher(policy, batch_send(self, name))
+            for name, policy in (batch_policies or {}).items()
+        }
 
         # 创建 gRPC 通道
-        if credentials:
+        if channel is not None:
+            self.channel = channel
+        elif credentials:
             self.channel = grpc.secure_channel(target, credentials)
         else:
             self.channel = grpc.insecure_channel(target)
 
-        # 动态创建 stub 实例
-        self.stub = self._create_stub()
+        # 进程内直连时不经过 protobuf，也就不需要 stub
+        self.direct = getattr(self.channel, "serialize", True) is False
+        self.stub = None if self.direct else self._create_stub()
 
     def _create_stub(self):
         """动态创建 gRPC stub 实例"""
         # 根据服务类文件推断模块名
-        source_file = inspect.getfile(self.service)
-        filename = os.path.splitext(os.path.basename(source_file))[0]
-        grpc_module_name = f"{filename}_pb2_grpc"
+        grpc_module_name = f"{source_package(self.service)}_pb2_grpc"
 
         try:
             # 导入 gRPC 模块
@@ -66,33 +138,164 @@ class gRPCClient:  # 修复拼写错误
         ):
             raise AttributeError(f"方法 {name} 未被 @expose 装饰")
 
-        # 获取原生 gRPC 方法（首字母大写，符合 gRPC 约定）
-        grpc_method_name = name
-        if not hasattr(self.stub, grpc_method_name):
-            raise AttributeError(f"gRPC stub 没有方法 {grpc_method_name}")
-
-        original_method = getattr(self.stub, grpc_method_name)
-
         # 提取类型注解
         signature = inspect.signature(annotated_method)
         parameters = list(signature.parameters.values())
         request_type = parameters[1].annotation  # 跳过 self 参数
         response_type = signature.return_annotation
 
-        def wrapper(request, **kwargs):
-            """自动转换的包装方法"""
-            try:
-                # pydantic -> protobuf
-                request_pb = convert_to_protobuf(request)
-                print(request_pb)
+        label = f"{self.service.__name__}/{name}"
+        mask_field = getattr(annotated_method, "__pybantic_field_mask__", None)
+        response_model = (
+            lite_model(response_type)
+            if getattr(annotated_method, "__pybantic_lite__", False)
+            else response_type
+        )
+
+        hooks = self.hooks
+
+        if self.direct:
+            # 进程内直连，pydantic 模型直接传给服务方法
+            direct_method = self.channel.model_unary_unary(self.service, name)
+
+            def call(request, **kwargs):
+                kwargs = self._with_metadata(label, request, kwargs)
+                phases = {}
+                code = grpc.StatusCode.OK
+                hook_call = (
+                    hooks.start("client", label, phases=phases, request=request)
+                    if hooks is not None
+                    else None
+                )
+                if hook_call is not None:
+                    hooks.phase_started(hook_call, "network")
+                started = time.perf_counter()
+                try:
+                    return self._invoke(name, direct_method, request, **kwargs)
+                except Exception as e:
+                    code = _status_code(e)
+                    raise
+                finally:
+                    phases["network"] = time.perf_counter() - started
+                    self.metrics.observe_call("client", label, phases, code)
+                    if hook_call is not None:
+                        hooks.phase_finished(hook_call, "network", phases["network"])
+                        hook_call.code = code
+                        hooks.call_finished(hook_call)
+
+        else:
+            # 获取原生 gRPC 方法（首字母大写，符合 gRPC 约定）
+            grpc_method_name = name
+            if not hasattr(self.stub, grpc_method_name):
+                raise AttributeError(f"gRPC stub 没有方法 {grpc_method_name}")
+
+            original_method = getattr(self.stub, grpc_method_name)
+
+            def call(request, **kwargs):
+                kwargs = self._with_metadata(label, request, kwargs)
+                phases = {}
+                code = grpc.StatusCode.OK
+                request_pb = response_pb = None
+                hook_call = (
+                    hooks.start("client", label, phases=phases, request=request)
+                    if hooks is not None
+                    else None
+                )
+                if hook_call is not None:
+                    hooks.phase_started(hook_call, "encode")
+                started = time.perf_counter()
+                try:
+                    # pydantic -> protobuf
+                    request_pb = convert_to_protobuf(request, pool=self.message_pool)
+                    encoded = time.perf_counter()
+                    phases["encode"] = encoded - started
+                    if hook_call is not None:
+                        hook_call.request_bytes = request_pb.ByteSize()
+                        hooks.phase_finished(hook_call, "encode", phases["encode"])
+                        hooks.phase_started(hook_call, "network")
+                        encoded = time.perf_counter()
 
-                # 调用原生 gRPC 方法
-                response_pb = original_method(request=request_pb, **kwargs)
-                print(response_pb)
+                    # 调用原生 gRPC 方法，按策略重试或对冲
+                    response_pb = self._invoke(
+                        name, original_method, request_pb, **kwargs
+                    )
+                    received = time.perf_counter()
+                    phases["network"] = received - encoded
+                    if hook_call is not None:
+                        hooks.phase_finished(hook_call, "network", phases["network"])
+                        hooks.phase_started(hook_call, "decode")
+                        received = time.perf_counter()
 
-                # protobuf -> pydantic
-                return convert_from_protobuf(response_type, response_pb)
+                    # protobuf -> pydantic，服务端按请求的字段掩码只返回了部分字段
+                    scope = (
+                        decode_cache() if self.response_decode_cache else nullcontext()
+                    )
+                    with scope:
+                        response = convert_from_protobuf(
+                            response_model,
+                            response_pb,
+                            getattr(request, mask_field) if mask_field else None,
+                        )
+                    phases["decode"] = time.perf_counter() - received
+                    if hook_call is not None:
+                        hooks.phase_finished(hook_call, "decode", phases["decode"])
+                    return response
+                except Exception as e:
+                    code = _status_code(e)
+                    raise
+                finally:
+                    request_bytes = (
+                        request_pb.ByteSize() if request_pb is not None else None
+                    )
+                    response_bytes = (
+                        response_pb.ByteSize() if response_pb is not None else None
+                    )
+                    self.metrics.observe_call(
+                        "client",
+                        label,
+                        phases,
+                        code,
+                        request_bytes=request_bytes,
+                        response_bytes=response_bytes,
+                    )
+                    if hook_call is not None:
+                        hook_call.code = code
+                        hook_call.request_bytes = request_bytes
+                        hook_call.response_bytes = response_bytes
+                        hooks.call_finished(hook_call)
+                    # 请求在发出时已经序列化，重试和对冲也都已结束
+                    if self.message_pool is not None and request_pb is not None:
+                        self.message_pool.release(request_pb)
 
+        cache = self.caches.get(name)
+        batcher = self.batchers.get(name)
+
+        def wrapper(request, **kwargs):
+            """自动转换的包装方法"""
+            if batcher is not None:
+                # 多个调用合并为一次 RPC，无法为单个调用附加元数据等选项
+                timeout = kwargs.pop("timeout", None)
+                if kwargs:
+                    raise TypeError(
+                        f"{self.service.__name__}.{name} 是批量发送的方法，"
+                        f"不支持参数：{', '.join(kwargs)}"
+                    )
+                future = batcher.submit(request)
+                try:
+                    # 批量发送时的异常已经由批量方法包装过
+                    return future.result(timeout=timeout)
+                except TimeoutError:
+                    raise RuntimeError(
+                        f"调用 {self.service.__name__}.{name} 失败：{timeout} 秒内没有返回"
+                    ) from None
+            try:
+                if cache is None:
+                    return call(request, **kwargs)
+                # 缓存命中时跳过网络请求和响应的转换
+                return cache.get_or_load(
+                    request_key(request),
+                    lambda: freeze_model(call(request, **kwargs)),
+                )
             except Exception as e:
                 raise RuntimeError(
                     f"调用 {self.service.__name__}.{name} 失败：{e}"
@@ -105,8 +308,41 @@ class gRPCClient:  # 修复拼写错误
 
         return wrapper
 
+    def _with_metadata(self, label: str, request, kwargs: dict) -> dict:
+        """调用 metadata_hooks，把返回的元数据附加到请求上"""
+        if not self.metadata_hooks:
+            return kwargs
+        metadata = list(kwargs.get("metadata") or ())
+        for hook in self.metadata_hooks:
+            metadata.extend(hook(label, request))
+        return {**kwargs, "metadata": tuple(metadata)}
+
+    def _invoke(self, name: str, original_method, request_pb, **kwargs):
+        """按方法的重试策略调用原生 gRPC 方法"""
+        policy = self.retry_policies.get(name)
+        if policy is None:
+            return original_method(request=request_pb, **kwargs)
+
+        if name not in self._latencies:
+            window = policy.window if isinstance(policy, HedgingPolicy) else 1000
+            self._latencies.setdefault(name, LatencyTracker(window))
+        args = (self.retry_budget, self.retry_stats[name], self._latencies[name])
+        if isinstance(policy, HedgingPolicy):
+            return call_with_hedging(policy, *args, original_method, request_pb, **kwargs)
+        return call_with_retry(
+            policy, *args, original_method, request=request_pb, **kwargs
+        )
+
+    def submit(self, name: str, request) -> Future:
+        """把请求放入方法的批量队列，立即返回该请求的 Future"""
+        if name not in self.batchers:
+            raise AttributeError(f"方法 {name} 没有配置批量策略")
+        return self.batchers[name].submit(request)
+
     def close(self):
         """关闭 gRPC 连接"""
+        for batcher in getattr(self, "batchers", {}).values():
+            batcher.close()
         if hasattr(self, "channel"):
             self.channel.close()
 
@@ -119,7 +355,10 @@ class gRPCClient:  # 修复拼写错误
 
 # 便捷函数
 def create_client(
-    service_class, target: str, credentials: Optional[grpc.ChannelCredentials] = None
+    service_class,
+    target: str,
+    credentials: Optional[grpc.ChannelCredentials] = None,
+    **kwargs,
 ) -> gRPCClient:
     """
     便捷的客户端创建函数
@@ -128,8 +367,9 @@ def create_client(
         service_class: 用 @pb.service 装饰的服务类
         target: 服务器地址 (如 'localhost:50051')
         credentials: gRPC 凭证
+        **kwargs: 透传给 gRPCClient 的其他参数，如 retry_policies
 
     Returns:
         配置好的客户端实例
     """
-    return gRPCClient(service_class, target, credentials)
+    return gRPCClient(service_class, target, credentials, **kwargs)
@@ -1,15 +1,71 @@
+import functools
 import importlib
-import inspect
-import os
-from typing import Any
+import itertools
+import sys
+from concurrent.futures import Executor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, Optional
 from pydantic import BaseModel, ValidationError, create_model
 from pydantic.fields import FieldInfo
 from google.protobuf.message import Message
-from google.protobuf.json_format import MessageToDict
 import typing
-from google.protobuf import json_format
 
-from pybantic.types import is_enum_type, is_map_type, is_message_type
+from pybantic.cache import current_decode_cache, freeze_model, message_key
+from pybantic.enums import member_from_number
+from pybantic.lite import lite_model
+from pybantic.pool import MessagePool
+from pybantic.sources import source_package
+from pybantic.types import (
+    FieldMask,
+    buffer_to_bytes,
+    get_oneof_field_name,
+    get_oneof_types,
+    get_optional_type,
+    is_array_type,
+    is_buffer_type,
+    is_enum_type,
+    is_lite_type,
+    is_map_type,
+    is_message_type,
+    is_oneof_type,
+    is_well_known_type,
+    is_wrapper_type,
+)
+
+# 字段掩码解析后的字段树，值为 None 表示整个字段，否则为子字段的掩码
+FieldMaskTree = dict[str, Optional[dict]]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@functools.cache
+def _parse_field_mask(paths: tuple[str, ...]) -> FieldMaskTree:
+    tree: FieldMaskTree = {}
+    # 短路径先处理，"a" 已经包含整个字段时忽略 "a.b"
+    for path in sorted(paths, key=lambda path: path.count(".")):
+        node: Optional[dict] = tree
+        *parents, leaf = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+            if node is None:
+                break
+        else:
+            node[leaf] = None
+    return tree
+
+
+def field_mask_tree(
+    field_mask: Optional[Iterable[str] | Any],
+) -> Optional[FieldMaskTree]:
+    """把 FieldMask（或路径列表）解析为字段树，没有路径时返回 None，表示转换全部字段"""
+    if field_mask is None:
+        return None
+    paths = getattr(field_mask, "paths", field_mask)
+    if isinstance(paths, str):
+        paths = [paths]
+    if not paths:
+        return None
+    return _parse_field_mask(tuple(paths))
 
 
 def _handle_field_missing(field_name: str, field_info: FieldInfo) -> None:
@@ -95,34 +151,736 @@ def _construct_model_data(
     return data
 
 
+def _enum_to_protobuf(annotation: Any, member: Any) -> int:
+    return annotation.__pybantic_numbers__[member]
+
+
+def _timestamp_to_datetime(message: Message) -> datetime:
+    return _EPOCH + timedelta(
+        seconds=message.seconds, microseconds=message.nanos // 1000
+    )
+
+
+def _datetime_to_timestamp(message: Message, value: datetime) -> None:
+    # 没有时区信息的 datetime 按 UTC 处理
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    message.seconds = delta.days * 86400 + delta.seconds
+    message.nanos = delta.microseconds * 1000
+
+
+def _duration_to_timedelta(message: Message) -> timedelta:
+    # Duration 的 nanos 和 seconds 同号，向零取整到微秒
+    return timedelta(seconds=message.seconds, microseconds=int(message.nanos / 1000))
+
+
+def _timedelta_to_duration(message: Message, value: timedelta) -> None:
+    micros = (value.days * 86400 + value.seconds) * 1_000_000 + value.microseconds
+    seconds, remainder = divmod(abs(micros), 1_000_000)
+    sign = -1 if micros < 0 else 1
+    message.seconds = sign * seconds
+    message.nanos = sign * remainder * 1000
+
+
+def _value_to_python(value: Message) -> Any:
+    kind = value.WhichOneof("kind")
+    if kind == "struct_value":
+        return _struct_to_dict(value.struct_value)
+    if kind == "list_value":
+        return [_value_to_python(item) for item in value.list_value.values]
+    if kind is None or kind == "null_value":
+        return None
+    return getattr(value, kind)
+
+
+def _struct_to_dict(message: Message) -> dict[str, Any]:
+    return {key: _value_to_python(value) for key, value in message.fields.items()}
+
+
+def _well_known_from_protobuf(annotation: Any, message: Message) -> Any:
+    if is_wrapper_type(annotation):
+        return message.value
+    if annotation is datetime:
+        return _timestamp_to_datetime(message)
+    if annotation is timedelta:
+        return _duration_to_timedelta(message)
+    if annotation is FieldMask:
+        return FieldMask(paths=list(message.paths))
+    return _struct_to_dict(message)
+
+
+def _well_known_to_protobuf(message: Message, annotation: Any, value: Any) -> None:
+    message.SetInParent()
+    if is_wrapper_type(annotation):
+        message.value = value
+    elif annotation is datetime:
+        _datetime_to_timestamp(message, value)
+    elif annotation is timedelta:
+        _timedelta_to_duration(message, value)
+    elif annotation is FieldMask:
+        message.paths.extend(value.paths)
+    else:
+        message.update(value)
+
+
+@functools.cache
+def _oneof_fields(name: str, annotation: Any) -> tuple[dict[str, Any], dict[Any, str]]:
+    """oneof 分支字段名到类型、运行时类型到分支字段名的映射"""
+    types_by_field = {
+        get_oneof_field_name(name, arg): arg for arg in get_oneof_types(annotation)
+    }
+    fields_by_type: dict[Any, str] = {}
+    for field, arg in types_by_field.items():
+        # NewType 定义的标量别名在运行时是其原始类型
+        fields_by_type.setdefault(getattr(arg, "__supertype__", arg), field)
+    return types_by_field, fields_by_type
+
+
+def _oneof_from_protobuf(
+    message: Message,
+    name: str,
+    annotation: Any,
+    mask: Optional[FieldMaskTree] = None,
+    lite: bool = False,
+) -> Any:
+    types_by_field, _ = _oneof_fields(name, annotation)
+    field = message.WhichOneof(name)
+    if field is None:
+        return None
+    arg, value = types_by_field[field], getattr(message, field)
+    if is_message_type(arg):
+        return _convert_nested(_nested_model(arg, lite), value, mask)
+    if is_enum_type(arg):
+        return member_from_number(arg, value)
+    if is_well_known_type(arg):
+        return _well_known_from_protobuf(arg, value)
+    if is_buffer_type(arg):
+        return memoryview(value)
+    return value
+
+
+def _oneof_to_protobuf(
+    message: Message,
+    name: str,
+    annotation: Any,
+    value: Any,
+    mask: Optional[FieldMaskTree] = None,
+) -> None:
+    types_by_field, fields_by_type = _oneof_fields(name, annotation)
+    field = fields_by_type.get(type(value))
+    if field is None:
+        # 子类，如 freeze_model 生成的不可变模型，以及轻量模型对应的完整模型
+        candidates = (*type(value).__mro__, getattr(value, "__pybantic_model__", None))
+        field = next(
+            (fields_by_type[cls] for cls in candidates if cls in fields_by_type),
+            None,
+        )
+        if field is None:
+            raise ValueError(f"Unsupported value for oneof {name}: {value!r}")
+    arg = types_by_field[field]
+    if is_message_type(arg):
+        submessage = getattr(message, field)
+        submessage.SetInParent()
+        _construct_message(submessage, value, mask)
+    elif is_enum_type(arg):
+        setattr(message, field, _enum_to_protobuf(arg, value))
+    elif is_well_known_type(arg):
+        _well_known_to_protobuf(getattr(message, field), arg, value)
+    elif is_buffer_type(arg):
+        setattr(message, field, buffer_to_bytes(value))
+    else:
+        setattr(message, field, value)
+
+
+# 字段的解码函数以 (message, 子字段掩码) 调用，返回 _SKIP 表示不设置该字段
+_SKIP = object()
+
+FieldDecoder = Callable[[Message, Optional[FieldMaskTree]], Any]
+FieldEncoder = Callable[[Message, Any, Optional[FieldMaskTree]], None]
+
+
+def _nested_model(model: type[BaseModel], lite: bool) -> type:
+    """轻量模型中嵌套的消息也解码为轻量模型"""
+    return lite_model(model) if lite else model
+
+
+def _field_decoder(name: str, info: FieldInfo, lite: bool = False) -> FieldDecoder:
+    """按字段的类型选出解码函数，类型判断只在生成转换计划时做一次"""
+    annotation = info.annotation
+
+    if is_oneof_type(annotation):
+        # 由 WhichOneof 直接确定分支，不需要逐个类型尝试
+        nullable = not info.is_required()
+
+        def decode(message, mask):
+            value = _oneof_from_protobuf(message, name, annotation, mask, lite)
+            return _SKIP if value is None and not nullable else value
+
+        return decode
+
+    if is_well_known_type(annotation):
+        unset = None if is_wrapper_type(annotation) else _SKIP
+
+        def decode(message, mask):
+            if not message.HasField(name):
+                return unset
+            return _well_known_from_protobuf(annotation, getattr(message, name))
+
+        return decode
+
+    optional = get_optional_type(annotation)
+    if optional is not None:
+        # Optional 的消息、枚举等是普通字段，未设置时解码为 None
+        decode_value = _field_decoder(name, FieldInfo(annotation=optional), lite)
+
+        def decode(message, mask):
+            value = decode_value(message, mask)
+            return None if value is _SKIP else value
+
+        return decode
+
+    origin = typing.get_origin(annotation)
+    if not origin:
+        if is_message_type(annotation):
+            target = _nested_model(annotation, lite)
+
+            def decode(message, mask):
+                if not message.HasField(name):
+                    return _SKIP
+                return _convert_nested(target, getattr(message, name), mask)
+
+        elif is_enum_type(annotation):
+
+            def decode(message, mask):
+                member = member_from_number(annotation, getattr(message, name))
+                return _SKIP if member is None else member
+
+        elif is_buffer_type(annotation):
+            # bytes 字段不做 base64 编解码，直接包装为 memoryview
+            def decode(message, mask):
+                return memoryview(getattr(message, name))
+
+        elif is_array_type(annotation):
+            # 切片一次性取出整个 repeated 容器，再整体拷贝进 array.array
+            def decode(message, mask):
+                return annotation(getattr(message, name)[:])
+
+        else:
+
+            def decode(message, mask):
+                return getattr(message, name)
+
+    elif origin is typing.Literal:
+        choices = typing.get_args(annotation)
+
+        def decode(message, mask):
+            value = getattr(message, name)
+            return value if value in choices else _SKIP
+
+    elif origin is list:
+        args0 = typing.get_args(annotation)[0]
+        if is_message_type(args0):
+            target = _nested_model(args0, lite)
+
+            def decode(message, mask):
+                return [
+                    _convert_nested(target, item, mask)
+                    for item in getattr(message, name)
+                ]
+
+        elif is_enum_type(args0):
+
+            # 本端不认识的编号无法表示为成员，和未设置的值一样丢弃
+            def decode(message, mask):
+                members = (
+                    member_from_number(args0, item) for item in getattr(message, name)
+                )
+                return [member for member in members if member is not None]
+
+        elif is_well_known_type(args0):
+
+            def decode(message, mask):
+                return [
+                    _well_known_from_protobuf(args0, item)
+                    for item in getattr(message, name)
+                ]
+
+        else:
+
+            def decode(message, mask):
+                return list(getattr(message, name))
+
+    elif origin is dict:
+        args0, args1 = typing.get_args(annotation)
+        assert is_map_type(args0, args1)
+        if is_message_type(args1):
+            target = _nested_model(args1, lite)
+
+            def decode(message, mask):
+                return {
+                    key: _convert_nested(target, item, mask)
+                    for key, item in getattr(message, name).items()
+                }
+
+        elif is_enum_type(args1):
+
+            def decode(message, mask):
+                members = (
+                    (key, member_from_number(args1, item))
+                    for key, item in getattr(message, name).items()
+                )
+                return {key: member for key, member in members if member is not None}
+
+        else:
+
+            def decode(message, mask):
+                return dict(getattr(message, name))
+
+    else:
+        raise ValueError(f"Unsupported field type: {origin}")
+    return decode
+
+
+@functools.cache
+def _decode_plan(model: type[BaseModel], descriptor: Any) -> dict[str, FieldDecoder]:
+    """模型在给定 message 类型上的解码计划，proto 中没有的字段不解码"""
+    fields = descriptor.fields_by_name
+    lite = is_lite_type(model)
+    return {
+        name: _field_decoder(name, info, lite)
+        for name, info in model.__pydantic_fields__.items()
+        if name in fields or is_oneof_type(info.annotation)
+    }
+
+
+def _construct_model_data_from_message(
+    model: type[BaseModel],
+    message: Message,
+    mask: Optional[FieldMaskTree] = None,
+) -> dict[str, Any]:
+    """直接读取 protobuf message 的字段，不经过 MessageToDict"""
+    plan = _decode_plan(model, message.DESCRIPTOR)
+    data = {}
+    if mask is None:
+        for name, decode in plan.items():
+            value = decode(message, None)
+            if value is not _SKIP:
+                data[name] = value
+        return data
+
+    # 只解码掩码中的字段，开销只和掩码中的字段数有关
+    for name, submask in mask.items():
+        decode = plan.get(name)
+        if decode is None:
+            if name not in model.__pydantic_fields__:
+                raise ValueError(f"Invalid field mask path: {name}")
+            continue
+        value = decode(message, submask)
+        if value is not _SKIP:
+            data[name] = value
+    return data
+
+
+def _convert_from_message(
+    model: type[BaseModel], message: Message, mask: Optional[FieldMaskTree]
+) -> BaseModel:
+    data = _construct_model_data_from_message(model, message, mask)
+    if is_lite_type(model):
+        return model.model_construct(**data)
+    if mask is not None:
+        # 只填充掩码中的字段，其余字段不转换也不校验
+        return model.model_construct(_fields_set=set(data), **data)
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        raise ValueError(f"Failed to convert from protobuf: {e}")
+
+
+def _convert_nested(
+    model: type[BaseModel], message: Message, mask: Optional[FieldMaskTree]
+) -> BaseModel:
+    """解码嵌套的子消息，启用了解码缓存时相同内容的子消息共享同一个冻结实例"""
+    cache = current_decode_cache()
+    # 轻量模型是可变的，不在多处共享
+    if (
+        cache is None
+        or mask is not None
+        or is_lite_type(model)
+        or not cache.accepts(model, message.ByteSize())
+    ):
+        return _convert_from_message(model, message, mask)
+    key = message_key(model, message.SerializeToString(deterministic=True))
+    return cache.get_or_load(
+        key, lambda: freeze_model(_convert_from_message(model, message, None))
+    )
+
+
 def convert_from_protobuf(
-    model: type[BaseModel], message: Message | dict[str, Any]
+    model: type[BaseModel],
+    message: Message | dict[str, Any],
+    field_mask: Optional[Iterable[str] | Any] = None,
 ) -> BaseModel:
+    """protobuf message 转换为 pydantic 模型
+
+    指定 field_mask（FieldMask 或路径列表）时只转换其中的字段，
+    返回的模型由 model_construct 构造，未转换的字段保持未设置。
+    model 为 lite_model(...) 生成的轻量类时，结果（包括嵌套的消息）都是轻量模型。
+    """
+    mask = field_mask_tree(field_mask)
     if isinstance(message, Message):
-        message = MessageToDict(
-            message=message,
-            preserving_proto_field_name=True,
-        )
-    model_fields = model.__pydantic_fields__
-    data = _construct_model_data(model_fields, message)
+        return _convert_from_message(model, message, mask)
+    if mask is not None:
+        raise TypeError("field_mask requires a protobuf message")
+    data = _construct_model_data(model.__pydantic_fields__, message)
     try:
         return model.model_validate(data)
     except ValidationError as e:
         raise ValueError(f"Failed to convert from protobuf: {e}")
 
 
-def convert_to_protobuf(model: BaseModel) -> Message:
-    source_file = inspect.getfile(model.__class__)
-    filename = os.path.splitext(os.path.basename(source_file))[0]
-    pb2_module_name = f"{filename}_pb2"
+@functools.cache
+def _message_class(model: type[BaseModel]) -> type[Message]:
+    model = getattr(model, "__pybantic_model__", model)
+    pb2_module_name = f"{source_package(model)}_pb2"
 
     mgscls = importlib.import_module(pb2_module_name)
-    message_class = getattr(mgscls, model.__class__.__name__)
-    message = message_class()
-    # msgcls = "" if model.__module__ == "__main__" else model.__module__
-    # msgcls += "." if msgcls else ""
-    # msgcls += model.__class__.__name__
-    # msgcls += "_pb2"
-    # mgscls = importlib.import_module(msgcls)
-    # message = mgscls()  # type:ignore
-    return json_format.ParseDict(model.model_dump(), message)
+    return getattr(mgscls, model.__name__)
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _array_encoder(name: str, annotation: Any) -> FieldEncoder:
+    """array.array 字段的编码函数
+
+    float/double 的 packed 编码就是小端字节序的原始字节，在小端机器上把 tobytes()
+    作为一个 packed 字段整体合并进 message，不为每个元素创建 Python 对象。
+    整数的 packed 编码是逐个元素的 varint，protobuf 的 repeated 字段只接受 Python 对象，
+    所以整数数组只能先 tolist() 再 extend，每个元素都会装箱。
+    """
+    if annotation.typecode_ not in ("f", "d") or sys.byteorder != "little":
+
+        def encode(message, value, mask):
+            getattr(message, name).extend(value.tolist())
+
+        return encode
+
+    # message 类 -> 字段的 tag 字节（字段号和 length-delimited 的 wire type）
+    tags: dict[type[Message], bytes] = {}
+
+    def encode(message, value, mask):
+        if not value:
+            return
+        tag = tags.get(message.__class__)
+        if tag is None:
+            number = message.DESCRIPTOR.fields_by_name[name].number
+            tag = tags[message.__class__] = _varint(number << 3 | 2)
+        raw = value.tobytes()
+        message.MergeFromString(tag + _varint(len(raw)) + raw)
+
+    return encode
+
+
+def _field_encoder(name: str, info: FieldInfo) -> FieldEncoder:
+    """按字段的类型选出编码函数，encoder(message, value, 子字段掩码) 设置 message 的字段"""
+    annotation = info.annotation
+
+    if is_well_known_type(annotation):
+
+        def encode(message, value, mask):
+            _well_known_to_protobuf(getattr(message, name), annotation, value)
+
+        return encode
+
+    if is_oneof_type(annotation):
+
+        def encode(message, value, mask):
+            _oneof_to_protobuf(message, name, annotation, value, mask)
+
+        return encode
+
+    optional = get_optional_type(annotation)
+    if optional is not None:
+        # None 不会传给编码函数
+        return _field_encoder(name, FieldInfo(annotation=optional))
+
+    origin = typing.get_origin(annotation)
+    if not origin:
+        if is_message_type(annotation):
+
+            def encode(message, value, mask):
+                submessage = getattr(message, name)
+                submessage.SetInParent()
+                _construct_message(submessage, value, mask)
+
+        elif is_enum_type(annotation):
+
+            def encode(message, value, mask):
+                setattr(message, name, _enum_to_protobuf(annotation, value))
+
+        elif is_buffer_type(annotation):
+
+            def encode(message, value, mask):
+                setattr(message, name, buffer_to_bytes(value))
+
+        elif is_array_type(annotation):
+            return _array_encoder(name, annotation)
+
+        else:
+
+            def encode(message, value, mask):
+                setattr(message, name, value)
+
+    elif origin is typing.Literal:
+
+        def encode(message, value, mask):
+            setattr(message, name, value)
+
+    elif origin is list:
+        args0 = typing.get_args(annotation)[0]
+        if is_message_type(args0):
+
+            def encode(message, value, mask):
+                container = getattr(message, name)
+                for item in value:
+                    _construct_message(container.add(), item, mask)
+
+        elif is_enum_type(args0):
+
+            def encode(message, value, mask):
+                getattr(message, name).extend(
+                    _enum_to_protobuf(args0, item) for item in value
+                )
+
+        elif is_well_known_type(args0):
+
+            def encode(message, value, mask):
+                container = getattr(message, name)
+                for item in value:
+                    _well_known_to_protobuf(container.add(), args0, item)
+
+        else:
+
+            def encode(message, value, mask):
+                getattr(message, name).extend(value)
+
+    elif origin is dict:
+        args1 = typing.get_args(annotation)[1]
+        if is_message_type(args1):
+
+            def encode(message, value, mask):
+                container = getattr(message, name)
+                for key, item in value.items():
+                    _construct_message(container[key], item, mask)
+
+        elif is_enum_type(args1):
+
+            def encode(message, value, mask):
+                container = getattr(message, name)
+                for key, item in value.items():
+                    container[key] = _enum_to_protobuf(args1, item)
+
+        else:
+
+            def encode(message, value, mask):
+                getattr(message, name).update(value)
+
+    else:
+        raise ValueError(f"Unsupported field type: {origin}")
+    return encode
+
+
+@functools.cache
+def _encode_plan(model: type[BaseModel]) -> dict[str, FieldEncoder]:
+    return {
+        name: _field_encoder(name, info)
+        for name, info in model.__pydantic_fields__.items()
+    }
+
+
+def _construct_message(
+    message: Message,
+    model: BaseModel,
+    mask: Optional[FieldMaskTree] = None,
+) -> Message:
+    """直接设置 protobuf message 的字段，不经过 model_dump 和 ParseDict"""
+    plan = _encode_plan(model.__class__)
+    # 按掩码解码得到的模型可能缺少部分字段，所以从 __dict__ 中取值
+    try:
+        values = model.__dict__
+    except AttributeError:
+        # 轻量模型只有 __slots__
+        values = {name: getattr(model, name, None) for name in plan}
+    if mask is None:
+        for name, encode in plan.items():
+            value = values.get(name)
+            if value is not None:
+                encode(message, value, None)
+        return message
+
+    for name, submask in mask.items():
+        encode = plan.get(name)
+        if encode is None:
+            raise ValueError(f"Invalid field mask path: {name}")
+        value = values.get(name)
+        if value is not None:
+            encode(message, value, submask)
+    return message
+
+
+def convert_to_protobuf(
+    model: BaseModel,
+    field_mask: Optional[Iterable[str] | Any] = None,
+    pool: Optional[MessagePool] = None,
+) -> Message:
+    """pydantic 模型转换为 protobuf message，指定 field_mask 时只设置其中的字段
+
+    指定 pool 时 message 从消息池中取得，调用方在序列化之后负责 release。
+    """
+    message_class = _message_class(model.__class__)
+    message = message_class() if pool is None else pool.acquire(message_class)
+    return _construct_message(message, model, field_mask_tree(field_mask))
+
+
+def _mask_value(value: Any, mask: Optional[FieldMaskTree]) -> Any:
+    if mask is None:
+        return value
+    if isinstance(value, list):
+        return [_mask_value(item, mask) for item in value]
+    if isinstance(value, dict):
+        return {key: _mask_value(item, mask) for key, item in value.items()}
+    if is_message_type(value.__class__) or is_lite_type(value.__class__):
+        return _mask_model(value, mask)
+    return value
+
+
+def _mask_model(model: BaseModel, mask: FieldMaskTree) -> BaseModel:
+    cls = model.__class__
+    data = {}
+    for name, submask in mask.items():
+        if name not in cls.__pydantic_fields__:
+            raise ValueError(f"Invalid field mask path: {name}")
+        value = getattr(model, name, None)
+        if value is not None:
+            data[name] = _mask_value(value, submask)
+    if is_lite_type(cls):
+        return cls.model_construct(**data)
+    return cls.model_construct(_fields_set=set(data), **data)
+
+
+def mask_model(
+    model: BaseModel, field_mask: Optional[Iterable[str] | Any] = None
+) -> BaseModel:
+    """按 field_mask 裁剪模型，结果和经过 protobuf 按掩码转换得到的部分模型一致
+
+    进程内不经过 protobuf 的调用用它返回和网络调用相同的部分模型。
+    """
+    mask = field_mask_tree(field_mask)
+    return model if mask is None else _mask_model(model, mask)
+
+
+def _annotation_models(annotation: Any) -> Iterable[type[BaseModel]]:
+    if is_message_type(annotation):
+        yield annotation
+    for arg in typing.get_args(annotation):
+        yield from _annotation_models(arg)
+
+
+def warm_converters(model: type[BaseModel]) -> list[type[BaseModel]]:
+    """预先导入 pb2 模块，构建 model 和它嵌套的所有消息的编码、解码计划
+
+    返回涉及的模型，轻量模型嵌套的消息同样按轻量模型预热。
+    """
+    lite = is_lite_type(model)
+    seen: list[type[BaseModel]] = []
+    pending = [model]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.append(current)
+        _decode_plan(current, _message_class(current).DESCRIPTOR)
+        _encode_plan(current)
+        for info in current.__pydantic_fields__.values():
+            pending.extend(
+                _nested_model(nested, lite)
+                for nested in _annotation_models(info.annotation)
+            )
+    return seen
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def _convert_chunk_from_protobuf(
+    model: type[BaseModel],
+    mask: Optional[FieldMaskTree],
+    messages: list[Message | bytes],
+) -> list[BaseModel]:
+    message_class = None
+    models = []
+    for message in messages:
+        if not isinstance(message, Message):
+            if message_class is None:
+                message_class = _message_class(model)
+            message = message_class.FromString(message)
+        models.append(_convert_from_message(model, message, mask))
+    return models
+
+
+def _convert_chunk_to_protobuf(
+    mask: Optional[FieldMaskTree], models: list[BaseModel]
+) -> list[Message]:
+    return [
+        _construct_message(_message_class(model.__class__)(), model, mask)
+        for model in models
+    ]
+
+
+def convert_many_from_protobuf(
+    model: type[BaseModel],
+    messages: Iterable[Message | bytes],
+    field_mask: Optional[Iterable[str] | Any] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 10_000,
+) -> list[BaseModel]:
+    """批量转换同一类型的 protobuf message，也可以直接传入序列化后的 bytes
+
+    转换计划和字段掩码只解析一次。指定 executor 时按 chunk_size 分块提交，
+    结果保持输入的顺序；转换是 CPU 密集的，使用 ProcessPoolExecutor 才能并行。
+    """
+    mask = field_mask_tree(field_mask)
+    messages = list(messages)
+    if executor is None or len(messages) <= chunk_size:
+        return _convert_chunk_from_protobuf(model, mask, messages)
+    convert = functools.partial(_convert_chunk_from_protobuf, model, mask)
+    return list(
+        itertools.chain.from_iterable(
+            executor.map(convert, _chunks(messages, chunk_size))
+        )
+    )
+
+
+def convert_many_to_protobuf(
+    models: Iterable[BaseModel],
+    field_mask: Optional[Iterable[str] | Any] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 10_000,
+) -> list[Message]:
+    """批量转换 pydantic 模型为 protobuf message，参数的含义同 convert_many_from_protobuf"""
+    mask = field_mask_tree(field_mask)
+    models = list(models)
+    if executor is None or len(models) <= chunk_size:
+        return _convert_chunk_to_protobuf(mask, models)
+    convert = functools.partial(_convert_chunk_to_protobuf, mask)
+    return list(
+        itertools.chain.from_iterable(executor.map(convert, _chunks(models, chunk_size)))
+    )
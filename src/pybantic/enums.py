@@ -1,6 +1,6 @@
 from __future__ import annotations
 from functools import wraps
-from typing import TypeVar, Callable, TYPE_CHECKING
+from typing import Any, TypeVar, Callable, TYPE_CHECKING
 from enum import Enum
 
 T = TypeVar("T", bound=Enum)
@@ -23,6 +23,9 @@ def enum(
 ):
     def decorator(target_cls: type[T]) -> type[T]:
         setattr(target_cls, "__pybantic_type__", "enum")
+        numbers = enum_numbers(target_cls)
+        setattr(target_cls, "__pybantic_numbers__", numbers)
+        setattr(target_cls, "__pybantic_members__", _members_table(numbers))
         pb.register(target_cls)
         return target_cls
 
@@ -33,3 +36,45 @@ def enum(
             target_cls=cls,
         )
     )
+
+
+def enum_numbers(cls: type[Enum]) -> dict[Any, int]:
+    """成员到 proto 编号的映射
+
+    成员的值全部是整数时直接用作编号，调整成员顺序不会改变线上的编号；
+    否则按定义顺序从 1 开始编号。
+    """
+    numbers = cls.__dict__.get("__pybantic_numbers__")
+    if numbers is not None:
+        return numbers
+    members = list(cls)
+    if all(
+        isinstance(member.value, int) and not isinstance(member.value, bool)
+        for member in members
+    ):
+        return {member: int(member.value) for member in members}
+    return {member: index for index, member in enumerate(members, start=1)}
+
+
+def _members_table(numbers: dict[Any, int]) -> list[Any] | dict[int, Any]:
+    """proto 编号到成员的查找表，编号稠密时使用以编号为下标的列表"""
+    if not numbers:
+        return []
+    low, high = min(numbers.values()), max(numbers.values())
+    if low < 0 or high > 4 * len(numbers) + 64:
+        return {number: member for member, number in numbers.items()}
+    table: list[Any] = [None] * (high + 1)
+    for member, number in numbers.items():
+        table[number] = member
+    return table
+
+
+def member_from_number(cls: type[Enum], number: int) -> Any:
+    """按 proto 编号查找成员，没有对应成员时返回 None，和未设置一样使用字段的默认值
+
+    proto3 的枚举是开放的，较新的对端可能发送本端还不认识的编号，解码不应因此失败。
+    """
+    table = cls.__pybantic_members__  # type: ignore[attr-defined]
+    if isinstance(table, list):
+        return table[number] if 0 <= number < len(table) else None
+    return table.get(number)
@@ -0,0 +1,229 @@
+import io
+import random
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+import grpc
+
+
+class CallInfo:
+    """一次调用的信息，在同一次调用的各个回调之间传递
+
+    request 在服务端是 protobuf 请求，在客户端是 pydantic 请求；
+    state 供钩子保存这次调用的私有状态，键建议使用钩子自身。
+    """
+
+    __slots__ = (
+        "side",
+        "method",
+        "request",
+        "started",
+        "request_bytes",
+        "response_bytes",
+        "phases",
+        "code",
+        "state",
+    )
+
+    def __init__(
+        self,
+        side: str,
+        method: str,
+        request_bytes: Optional[int] = None,
+        phases: Optional[dict[str, float]] = None,
+        request: Any = None,
+    ) -> None:
+        self.side = side
+        self.method = method
+        self.request = request
+        self.started = time.perf_counter()
+        self.request_bytes = request_bytes
+        self.response_bytes: Optional[int] = None
+        self.phases = {} if phases is None else phases
+        self.code = grpc.StatusCode.OK
+        self.state: dict = {}
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class Hook:
+    """RPC 各阶段的回调，默认什么都不做，子类只覆盖需要的方法
+
+    服务端：call_started 在收到请求时调用，阶段依次为 decode、handler、encode，
+    call_finished 在响应交给 gRPC 发送之前调用；
+    客户端：call_started 在发起调用时调用，阶段依次为 encode、network、decode，
+    进程内直连时只有 network，call_finished 在得到响应或失败之后调用。
+    """
+
+    def call_started(self, call: CallInfo) -> None:
+        pass
+
+    def phase_started(self, call: CallInfo, phase: str) -> None:
+        pass
+
+    def phase_finished(self, call: CallInfo, phase: str, seconds: float) -> None:
+        pass
+
+    def call_finished(self, call: CallInfo) -> None:
+        pass
+
+
+class HookChain(Hook):
+    """依次调用多个钩子，没有注册钩子时调用方持有 None，不产生额外开销"""
+
+    def __init__(self, hooks: Iterable[Hook]) -> None:
+        self.hooks = tuple(hooks)
+
+    def start(
+        self,
+        side: str,
+        method: str,
+        request_bytes: Optional[int] = None,
+        phases: Optional[dict[str, float]] = None,
+        request: Any = None,
+    ) -> CallInfo:
+        call = CallInfo(side, method, request_bytes, phases, request)
+        self.call_started(call)
+        return call
+
+    def call_started(self, call: CallInfo) -> None:
+        for hook in self.hooks:
+            hook.call_started(call)
+
+    def phase_started(self, call: CallInfo, phase: str) -> None:
+        for hook in self.hooks:
+            hook.phase_started(call, phase)
+
+    def phase_finished(self, call: CallInfo, phase: str, seconds: float) -> None:
+        for hook in self.hooks:
+            hook.phase_finished(call, phase, seconds)
+
+    def call_finished(self, call: CallInfo) -> None:
+        for hook in self.hooks:
+            hook.call_finished(call)
+
+
+def hook_chain(hooks: Optional[Iterable[Hook]]) -> Optional[HookChain]:
+    hooks = tuple(hooks or ())
+    return HookChain(hooks) if hooks else None
+
+
+class _Sampler(Hook):
+    def __init__(
+        self,
+        sample_rate: float = 0.01,
+        slow_seconds: float = 0.1,
+        top: int = 10,
+        methods: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.top = top
+        self.methods = set(methods) if methods is not None else None
+
+    def _sampled(self, call: CallInfo) -> bool:
+        if self.methods is not None and call.method not in self.methods:
+            return False
+        return random.random() < self.sample_rate
+
+
+class ProfileHook(_Sampler):
+    """按采样率用 cProfile 剖析整次调用，超过 slow_seconds 的调用记录耗时最多的函数
+
+    slowest 保存每个方法最慢的一次剖析结果（pstats.Stats），可以用 pstats 进一步查看。
+    cProfile、pstats 和 tracemalloc 都在第一次采样时才导入。
+    """
+
+    def __init__(self, *args, sort: str = "cumulative", **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.sort = sort
+        self.slowest: dict[str, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def call_started(self, call: CallInfo) -> None:
+        if not self._sampled(call):
+            return
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 当前线程已经有别的剖析器
+            return
+        call.state[self] = profiler
+
+    def call_finished(self, call: CallInfo) -> None:
+        profiler = call.state.pop(self, None)
+        if profiler is None:
+            return
+        profiler.disable()
+        elapsed = call.elapsed
+        if elapsed < self.slow_seconds:
+            return
+        import pstats
+
+        stats = pstats.Stats(profiler)
+        with self._lock:
+            previous = self.slowest.get(call.method)
+            if previous is None or previous[0] < elapsed:
+                self.slowest[call.method] = (elapsed, stats)
+        output = io.StringIO()
+        stats.stream = output  # type: ignore
+        stats.sort_stats(self.sort).print_stats(self.top)
+        print(
+            f"Slow {call.side} call {call.method} took {elapsed:.3f}s {call.phases}\n"
+            f"{output.getvalue()}"
+        )
+
+
+class AllocationHook(_Sampler):
+    """按采样率用 tracemalloc 记录整次调用的内存分配，超过 slow_seconds 的调用记录分配最多的代码行
+
+    tracemalloc 是进程全局的，同一时间只采样一次调用，采样期间其他线程的分配也会被计入，
+    所有线程的分配都会变慢，sample_rate 应该保持很低。
+    """
+
+    def __init__(self, *args, frames: int = 1, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.frames = frames
+        self._active = threading.Lock()
+
+    def call_started(self, call: CallInfo) -> None:
+        if not self._sampled(call) or not self._active.acquire(blocking=False):
+            return
+        import tracemalloc
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        call.state[self] = (started_tracing, tracemalloc.take_snapshot())
+
+    def call_finished(self, call: CallInfo) -> None:
+        sampled = call.state.pop(self, None)
+        if sampled is None:
+            return
+        started_tracing, before = sampled
+        import tracemalloc
+
+        try:
+            elapsed = call.elapsed
+            if elapsed < self.slow_seconds:
+                return
+            peak = tracemalloc.get_traced_memory()[1]
+            ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            differences = after.compare_to(before.filter_traces(ignore), "lineno")
+            top = "\n".join(str(item) for item in differences[: self.top])
+            print(
+                f"Slow {call.side} call {call.method} took {elapsed:.3f}s, "
+                f"peak traced memory {peak} bytes\n{top}"
+            )
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._active.release()
@@ -0,0 +1,452 @@
+from __future__ import annotations
+import time
+from concurrent import futures
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional
+
+import grpc
+
+if TYPE_CHECKING:
+    from pybantic.client import gRPCClient
+    from pybantic.main import Pybantic
+
+
+class InProcessRpcError(grpc.RpcError):
+    """进程内调用失败时抛出，和网络调用的 grpc.RpcError 一样提供 code() 和 details()"""
+
+    def __init__(
+        self,
+        code: grpc.StatusCode,
+        details: str = "",
+        trailing_metadata: tuple = (),
+    ) -> None:
+        super().__init__(f"{code}: {details}")
+        self._code = code
+        self._details = details
+        self._trailing_metadata = trailing_metadata
+
+    def code(self) -> grpc.StatusCode:
+        return self._code
+
+    def details(self) -> str:
+        return self._details
+
+    def trailing_metadata(self) -> tuple:
+        return self._trailing_metadata
+
+    def initial_metadata(self) -> tuple:
+        return ()
+
+
+class _AbortError(Exception):
+    pass
+
+
+class InProcessContext(grpc.ServicerContext):
+    """进程内调用的服务端上下文"""
+
+    def __init__(self, metadata: Optional[tuple] = None, timeout: Optional[float] = None):
+        self._metadata = tuple(metadata or ())
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+        self._code: Optional[grpc.StatusCode] = None
+        self._details: Optional[str] = None
+        self._trailing_metadata: tuple = ()
+        self._callbacks: list[Callable] = []
+        self._cancelled = False
+
+    def invocation_metadata(self):
+        return self._metadata
+
+    def peer(self):
+        return "inprocess"
+
+    def peer_identities(self):
+        return None
+
+    def peer_identity_key(self):
+        return None
+
+    def auth_context(self):
+        return {}
+
+    def time_remaining(self):
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    def is_active(self):
+        return not self._cancelled and self.time_remaining() != 0.0
+
+    def cancel(self):
+        self._cancelled = True
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+        return True
+
+    def set_code(self, code):
+        self._code = code
+
+    def set_details(self, details):
+        self._details = details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+    def set_trailing_metadata(self, trailing_metadata):
+        self._trailing_metadata = tuple(trailing_metadata)
+
+    def trailing_metadata(self):
+        return self._trailing_metadata
+
+    def send_initial_metadata(self, initial_metadata):
+        pass
+
+    def set_compression(self, compression):
+        pass
+
+    def disable_next_message_compression(self):
+        pass
+
+    def abort(self, code, details):
+        self._code, self._details = code, details
+        raise _AbortError(details)
+
+    def abort_with_status(self, status):
+        self._trailing_metadata = tuple(status.trailing_metadata or ())
+        self.abort(status.code, status.details)
+
+    def _finish(self) -> None:
+        for callback in self._callbacks:
+            callback()
+
+    def _error(self, e: Exception) -> InProcessRpcError:
+        """和 grpc 服务端一致：优先使用 handler 设置的状态码，否则为 UNKNOWN"""
+        if isinstance(e, InProcessRpcError):
+            return e
+        code = self._code or grpc.StatusCode.UNKNOWN
+        if code is grpc.StatusCode.OK:
+            code = grpc.StatusCode.UNKNOWN
+        details = self._details
+        if details is None:
+            details = f"Exception calling application: {e}"
+        return InProcessRpcError(code, details, self._trailing_metadata)
+
+
+class _HandlerCallDetails(grpc.HandlerCallDetails):
+    def __init__(self, method: str, invocation_metadata: tuple = ()) -> None:
+        self.method = method
+        self.invocation_metadata = invocation_metadata
+
+
+class _HandlerCollector:
+    """代替 grpc.Server 收集 add_XServicer_to_server 和通用处理器注册的方法处理器"""
+
+    def __init__(self) -> None:
+        self.handlers: dict[str, grpc.RpcMethodHandler] = {}
+        self.generic_handlers: list[grpc.GenericRpcHandler] = []
+
+    def add_generic_rpc_handlers(self, generic_rpc_handlers) -> None:
+        self.generic_handlers.extend(generic_rpc_handlers)
+
+    def add_registered_method_handlers(self, service_name, method_handlers) -> None:
+        for method_name, handler in method_handlers.items():
+            self.handlers[f"/{service_name}/{method_name}"] = handler
+
+
+class _MultiCallable:
+    """单个响应的调用，请求为单个消息或消息的迭代器"""
+
+    def __init__(
+        self,
+        channel: InProcessChannel,
+        invoke: Callable[[Any, InProcessContext], Any],
+        serialize: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        self._channel = channel
+        self._invoke = invoke
+        self._serialize = serialize
+
+    def _call(self, request, timeout=None, metadata=None):
+        context = InProcessContext(metadata, timeout)
+        try:
+            if timeout is None:
+                return self._invoke(request, context)
+            # 和网络调用一致：超时后客户端收到 DEADLINE_EXCEEDED，服务端继续执行
+            future = self._channel._executor.submit(self._invoke, request, context)
+            try:
+                return future.result(timeout=timeout)
+            except futures.TimeoutError:
+                context.cancel()
+                raise InProcessRpcError(
+                    grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline Exceeded"
+                )
+        finally:
+            context._finish()
+
+    def _prepare(self, request):
+        # 和网络调用一致，在调用线程中立即序列化请求，之后调用方就可以释放请求
+        return self._serialize(request) if self._serialize else request
+
+    def __call__(self, request, timeout=None, metadata=None, **kwargs):
+        return self._call(self._prepare(request), timeout, metadata)
+
+    def with_call(self, request, timeout=None, metadata=None, **kwargs):
+        return self._call(self._prepare(request), timeout, metadata), None
+
+    def future(self, request, timeout=None, metadata=None, **kwargs):
+        return self._channel._future_executor.submit(
+            self._call, self._prepare(request), timeout, metadata
+        )
+
+
+class _UnaryUnaryMultiCallable(_MultiCallable, grpc.UnaryUnaryMultiCallable):
+    pass
+
+
+class _StreamUnaryMultiCallable(_MultiCallable, grpc.StreamUnaryMultiCallable):
+    def _prepare(self, request_iterator):
+        # 请求流在处理器读取时才逐个序列化，和网络调用一样惰性地消费迭代器
+        if self._serialize is None:
+            return request_iterator
+        return (self._serialize(request) for request in request_iterator)
+
+
+class _ResponseStreamMultiCallable:
+    """响应流的调用，返回在迭代时逐个产生响应的迭代器"""
+
+    def __init__(
+        self,
+        invoke: Callable[[Any, InProcessContext], Iterator[Any]],
+        serialize: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        self._invoke = invoke
+        self._serialize = serialize
+
+    def _prepare(self, request):
+        return self._serialize(request) if self._serialize else request
+
+    def _stream(self, request, timeout, metadata) -> Iterator[Any]:
+        context = InProcessContext(metadata, timeout)
+        try:
+            for response in self._invoke(request, context):
+                if context.time_remaining() == 0.0:
+                    context.cancel()
+                    raise InProcessRpcError(
+                        grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline Exceeded"
+                    )
+                yield response
+        finally:
+            context._finish()
+
+    def __call__(self, request, timeout=None, metadata=None, **kwargs):
+        return self._stream(self._prepare(request), timeout, metadata)
+
+
+class _UnaryStreamMultiCallable(
+    _ResponseStreamMultiCallable, grpc.UnaryStreamMultiCallable
+):
+    pass
+
+
+class _StreamStreamMultiCallable(
+    _ResponseStreamMultiCallable, grpc.StreamStreamMultiCallable
+):
+    def _prepare(self, request_iterator):
+        if self._serialize is None:
+            return request_iterator
+        return (self._serialize(request) for request in request_iterator)
+
+
+def _responses(
+    responses: Iterator[Any],
+    context: InProcessContext,
+    convert: Callable[[Any], Any],
+) -> Iterator[Any]:
+    # 处理器在迭代中抛出的异常和单个响应一样转换为状态码
+    try:
+        for response in responses:
+            yield convert(response)
+    except Exception as e:
+        raise context._error(e) from e
+
+
+class InProcessChannel(grpc.Channel):
+    """把 gRPCClient 的调用直接路由到同一进程内 @pb.service 的实现
+
+    serialize=True 时请求和响应会完整地经过 convert_*_protobuf 和二进制序列化，
+    用于检查线上协议的兼容性；serialize=False 时 pydantic 模型直接传给服务方法，
+    不做任何转换和序列化。两种模式的超时、元数据和状态码语义都和网络调用一致。
+    流式方法按请求和响应的迭代器调用注册的处理器，包括通用处理器注册的方法。
+    """
+
+    def __init__(self, pb: Pybantic, serialize: bool = False, max_workers: int = 10):
+        self.pb = pb
+        self.serialize = serialize
+        # 执行服务方法的线程池；future() 在另一个线程池中等待它，
+        # 等待的线程不会占用执行服务方法的线程，线程池满时也不会互相等待而死锁
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._future_executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._collector: Optional[_HandlerCollector] = None
+        self._services: dict[type, Any] = {}
+
+    def _handler(
+        self, method: str, context: InProcessContext
+    ) -> Optional[grpc.RpcMethodHandler]:
+        if self._collector is None:
+            collector = _HandlerCollector()
+            self.pb._add_services(collector)
+            self._collector = collector
+        handler = self._collector.handlers.get(method)
+        if handler is not None:
+            return handler
+        # 和 grpc 服务端一样，按注册顺序询问通用处理器
+        details = _HandlerCallDetails(method, context.invocation_metadata())
+        for generic_handler in self._collector.generic_handlers:
+            handler = generic_handler.service(details)
+            if handler is not None:
+                return handler
+        return None
+
+    def _method_invoke(
+        self,
+        method: str,
+        response_deserializer: Optional[Callable[[Any], Any]],
+        request_streaming: bool,
+        response_streaming: bool,
+    ) -> Callable[[Any, InProcessContext], Any]:
+        """以 (请求, context) 调用方法处理器，流式的请求和响应逐个反序列化"""
+
+        def invoke(payload, context):
+            handler = self._handler(method, context)
+            if (
+                handler is None
+                or handler.request_streaming != request_streaming
+                or handler.response_streaming != response_streaming
+            ):
+                raise InProcessRpcError(
+                    grpc.StatusCode.UNIMPLEMENTED, "Method not found!"
+                )
+            deserialize = handler.request_deserializer
+            if deserialize and request_streaming:
+                payload = (deserialize(item) for item in payload)
+            elif deserialize:
+                payload = deserialize(payload)
+
+            def convert(response):
+                if handler.response_serializer:
+                    response = handler.response_serializer(response)
+                if response_deserializer:
+                    response = response_deserializer(response)
+                return response
+
+            if request_streaming:
+                behavior = (
+                    handler.stream_stream if response_streaming else handler.stream_unary
+                )
+            else:
+                behavior = (
+                    handler.unary_stream if response_streaming else handler.unary_unary
+                )
+            try:
+                response = behavior(payload, context)
+            except Exception as e:
+                raise context._error(e) from e
+            if response_streaming:
+                return _responses(response, context, convert)
+            return convert(response)
+
+        return invoke
+
+    def unary_unary(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        _registered_method=False,
+    ):
+        invoke = self._method_invoke(method, response_deserializer, False, False)
+        return _UnaryUnaryMultiCallable(self, invoke, request_serializer)
+
+    def model_unary_unary(self, service: type, name: str) -> _UnaryUnaryMultiCallable:
+        """不经过 protobuf，直接以 pydantic 模型调用服务方法
+
+        和网络调用一致：服务方法拿到请求的副本，lite 方法以轻量模型收发，
+        @expose(field_mask=...) 的方法只返回掩码中的字段，服务端的指标、钩子和慢调用照常记录。
+        """
+        serve = self.pb._model_method(service, name)
+
+        def invoke(request, context):
+            if service not in self._services:
+                self._services[service] = service()
+            try:
+                return serve(self._services[service], request, context)
+            except Exception as e:
+                raise context._error(e) from e
+
+        return _UnaryUnaryMultiCallable(self, invoke)
+
+    def unary_stream(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        _registered_method=False,
+    ):
+        invoke = self._method_invoke(method, response_deserializer, False, True)
+        return _UnaryStreamMultiCallable(invoke, request_serializer)
+
+    def stream_unary(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        _registered_method=False,
+    ):
+        invoke = self._method_invoke(method, response_deserializer, True, False)
+        return _StreamUnaryMultiCallable(self, invoke, request_serializer)
+
+    def stream_stream(
+        self,
+        method,
+        request_serializer=None,
+        response_deserializer=None,
+        _registered_method=False,
+    ):
+        invoke = self._method_invoke(method, response_deserializer, True, True)
+        return _StreamStreamMultiCallable(invoke, request_serializer)
+
+    def subscribe(self, callback, try_to_connect=False):
+        callback(grpc.ChannelConnectivity.READY)
+
+    def unsubscribe(self, callback):
+        pass
+
+    def close(self):
+        self._future_executor.shutdown(wait=False)
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def create_inprocess_client(
+    pb: Pybantic,
+    service_class,
+    serialize: bool = False,
+    **kwargs,
+) -> gRPCClient:
+    """创建通过 InProcessChannel 调用同一进程内服务的客户端"""
+    from pybantic.client import gRPCClient
+
+    return gRPCClient(
+        service_class,
+        target="inprocess",
+        channel=InProcessChannel(pb, serialize=serialize),
+        **kwargs,
+    )
@@ -0,0 +1,130 @@
+import functools
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+from pybantic.types import is_message_type
+
+T = TypeVar("T", bound=BaseModel)
+
+
+def _to_full(value: Any) -> Any:
+    if isinstance(value, LiteModel):
+        return value.to_full()
+    if isinstance(value, list):
+        return [_to_full(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_full(item) for key, item in value.items()}
+    return value
+
+
+def _to_lite(value: Any) -> Any:
+    if isinstance(value, BaseModel) and is_message_type(value.__class__):
+        return lite_model(value.__class__).from_full(value)
+    if isinstance(value, list):
+        return [_to_lite(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_lite(item) for key, item in value.items()}
+    return value
+
+
+class LiteModel:
+    """@pb.message 模型的轻量表示，只有 __slots__，没有 __dict__ 和校验
+
+    字段和 protobuf 的转换与完整模型一致，需要校验或 pydantic 的功能时用 to_full() 升级。
+    """
+
+    __slots__ = ()
+    __pybantic_type__ = "lite"
+    __pybantic_model__: type[BaseModel]
+    __pydantic_fields__: dict
+
+    def __init__(self, **values: Any) -> None:
+        for name, info in self.__pydantic_fields__.items():
+            if name in values:
+                object.__setattr__(self, name, values.pop(name))
+            elif info.is_required():
+                raise TypeError(f"{self.__class__.__name__} missing field: {name}")
+            else:
+                object.__setattr__(
+                    self, name, info.get_default(call_default_factory=True)
+                )
+        if values:
+            raise TypeError(
+                f"{self.__class__.__name__} got unexpected fields: {', '.join(values)}"
+            )
+
+    @classmethod
+    def model_construct(cls, **values: Any) -> "LiteModel":
+        """和 BaseModel.model_construct 一样，缺少的必填字段保持未设置"""
+        instance = cls.__new__(cls)
+        for name, info in cls.__pydantic_fields__.items():
+            if name in values:
+                object.__setattr__(instance, name, values[name])
+            elif not info.is_required():
+                object.__setattr__(
+                    instance, name, info.get_default(call_default_factory=True)
+                )
+        return instance
+
+    @classmethod
+    def from_full(cls, instance: BaseModel) -> "LiteModel":
+        return cls.model_construct(
+            **{
+                name: _to_lite(instance.__dict__[name])
+                for name in cls.__pydantic_fields__
+                if name in instance.__dict__
+            }
+        )
+
+    def to_full(self) -> BaseModel:
+        """升级为完整的 pydantic 模型，嵌套的轻量模型一并升级，并做完整的校验"""
+        return self.__pybantic_model__.model_validate(
+            {
+                name: _to_full(getattr(self, name))
+                for name in self.__pydantic_fields__
+                if hasattr(self, name)
+            }
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(
+            getattr(self, name, None) == getattr(other, name, None)
+            for name in self.__pydantic_fields__
+        )
+
+    def __hash__(self) -> int:
+        # 和完整模型一致：只有 frozen 的模型可以哈希
+        if not self.__pybantic_model__.model_config.get("frozen"):
+            raise TypeError(f"unhashable type: '{self.__class__.__name__}'")
+        return hash(
+            (self.__class__,)
+            + tuple(getattr(self, name, None) for name in self.__pydantic_fields__)
+        )
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in self.__pydantic_fields__
+            if hasattr(self, name)
+        )
+        return f"{self.__class__.__name__}({fields})"
+
+
+@functools.cache
+def lite_model(model: type[T]) -> type[LiteModel]:
+    """由 @pb.message 模型生成 `{Name}Lite` 轻量类，字段和 protobuf 转换都和原模型一致"""
+    fields = model.__pydantic_fields__
+    return type(
+        f"{model.__name__}Lite",
+        (LiteModel,),
+        {
+            "__slots__": tuple(fields),
+            "__module__": model.__module__,
+            "__qualname__": f"{model.__qualname__}Lite",
+            "__pybantic_model__": model,
+            "__pydantic_fields__": fields,
+        },
+    )
@@ -1,11 +1,17 @@
 from concurrent import futures
+import copy
 import importlib
 import inspect
 from collections import defaultdict
 import os
-from typing import Callable, overload
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Iterable, Optional, overload
 
 import grpc
+from pydantic import BaseModel
 from pybantic.message import message, T as MessageT
 from pybantic.service import (
     service,
@@ -15,25 +21,108 @@ from pybantic.service import (
     ModelResponse as ModelResponseT,
 )
 from pybantic.enums import enum, T as EnumT
-
-# Templates are imported in render module
-from pybantic.render import (
-    enums_render,
-    messages_render,
-    services_render,
-    package_render,
+from pybantic.cache import decode_cache
+from pybantic.capture import CapturePolicy, CaptureWriter, capturing_handler
+from pybantic.convert import (
+    _message_class,
+    convert_from_protobuf,
+    convert_to_protobuf,
+    mask_model,
+    warm_converters,
 )
-from pybantic.convert import convert_from_protobuf, convert_to_protobuf
-
-from grpc_tools.command import build_package_protos
+from pybantic.hooks import Hook, hook_chain
+from pybantic.lite import lite_model
+from pybantic.metrics import MetricsRegistry, default_registry
+from pybantic.pool import MessagePool, pooled_handler
+from pybantic.slowlog import SlowCallPolicy, SlowCallRecorder, admin_handler
+from pybantic.sources import package_name, source_file, source_package
+
+HandlerWrapper = Callable[[str, grpc.RpcMethodHandler], grpc.RpcMethodHandler]
+
+
+class _WrappedServer:
+    """包装 grpc.Server，注册方法处理器时依次用 wrappers 替换处理器"""
+
+    def __init__(self, server, wrappers: list[HandlerWrapper]) -> None:
+        self._server = server
+        self._wrappers = wrappers
+
+    def add_registered_method_handlers(self, service_name, method_handlers) -> None:
+        handlers = {}
+        for name, handler in method_handlers.items():
+            for wrap in self._wrappers:
+                handler = wrap(f"/{service_name}/{name}", handler)
+            handlers[name] = handler
+        self._server.add_registered_method_handlers(service_name, handlers)
+
+    def __getattr__(self, name):
+        return getattr(self._server, name)
+
+
+def _exposed_methods(user_service) -> dict[str, dict]:
+    """服务类中所有暴露的方法及其类型信息"""
+    exposed_methods = {}
+    for attr_name in dir(user_service):
+        attr = getattr(user_service, attr_name)
+        if hasattr(attr, "__pybantic_type__") and attr.__pybantic_type__ == "method":
+            # 获取方法的类型注解
+            signature = inspect.signature(attr)
+            params = list(signature.parameters.values())
+            if len(params) >= 2:  # self + request
+                request_type = params[1].annotation
+                response_type = signature.return_annotation
+                if getattr(attr, "__pybantic_lite__", False):
+                    request_type = lite_model(request_type)
+                exposed_methods[attr_name] = {
+                    "method": attr,
+                    "request_type": request_type,
+                    "response_type": response_type,
+                    "field_mask": getattr(attr, "__pybantic_field_mask__", None),
+                }
+    return exposed_methods
 
 
 class Pybantic:
-    def __init__(self) -> None:
-        self.registry: dict[str, dict[str, list]] = defaultdict(
+    def __init__(
+        self,
+        metrics: Optional[MetricsRegistry] = None,
+        request_decode_cache: bool = False,
+        message_pool: Optional[MessagePool] = None,
+        capture: Optional[CapturePolicy] = None,
+        hooks: Optional[list[Hook]] = None,
+        slow_calls: Optional[SlowCallPolicy] = None,
+        build_dir: Optional[str] = None,
+    ) -> None:
+        self._registry: dict[str, dict[str, list]] = defaultdict(
             lambda: defaultdict(list)
         )
+        self._pending: list[type] = []
         self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        self.metrics = default_registry if metrics is None else metrics
+        # 为每个请求的解码使用独立的解码缓存，请求内相同的子消息只解码一次
+        self.request_decode_cache = request_decode_cache
+        # 响应 message 从消息池中取得，序列化之后归还
+        self.message_pool = message_pool
+        # 按采样率把请求的原始字节录制到文件中，用 `pybantic replay` 重放
+        self.capture = capture
+        self.capture_writer: Optional[CaptureWriter] = None
+        # 记录每个方法最慢的调用，通过本机的 pybantic.Admin/SlowCalls 查询
+        self.slow_calls: Optional[SlowCallRecorder] = None
+        hooks = list(hooks or ())
+        if slow_calls is not None:
+            self.slow_calls = SlowCallRecorder(slow_calls)
+            hooks.append(self.slow_calls)
+        # 请求各阶段的回调，用于追踪和剖析
+        self.hooks = hook_chain(hooks)
+        # 预热完成、开始接受请求之后设置
+        self.ready = threading.Event()
+        # `pybantic build` 的输出目录，指定时从中导入 pb2 模块，运行时不再生成和编译
+        self.build_dir = build_dir
+        self._build_verified = False
+        if build_dir is not None:
+            build_dir = os.path.abspath(build_dir)
+            if build_dir not in sys.path:
+                sys.path.insert(0, build_dir)
 
     @overload
     def enum(
@@ -119,6 +208,7 @@ class Pybantic:
             **kwargs,
         )
 
+    @overload
     def expose(
         self,
         smtd: Callable[
@@ -128,124 +218,377 @@ class Pybantic:
     ) -> Callable[
         [ServiceT, ModelRequestT],
         ModelResponseT,
-    ]:
-        return expose(method=smtd)
+    ]: ...
+
+    @overload
+    def expose(
+        self,
+        smtd: None = None,
+        /,
+        **kwargs,
+    ) -> Callable[
+        [Callable[[ServiceT, ModelRequestT], ModelResponseT]],
+        Callable[[ServiceT, ModelRequestT], ModelResponseT],
+    ]: ...
+
+    def expose(
+        self,
+        smtd: Callable[[ServiceT, ModelRequestT], ModelResponseT] | None = None,
+        /,
+        **kwargs,
+    ):
+        return expose(smtd, **kwargs)
 
     def register(self, element: type[MessageT | ServiceT]) -> None:
-        element_type = element.__pybantic_type__  # type: ignore
-        absfile = inspect.getabsfile(element)
-        self.registry[absfile][element_type].append(element)
+        # 导入时只记录元素，按源文件分类推迟到第一次访问 registry 时批量进行
+        self._pending.append(element)
+
+    @property
+    def registry(self) -> dict[str, dict[str, list]]:
+        """源文件的绝对路径 -> 元素类型 -> 该文件中注册的元素"""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            for element in pending:
+                element_type = element.__pybantic_type__  # type: ignore
+                self._registry[source_file(element)][element_type].append(element)
+        return self._registry
+
+    @registry.setter
+    def registry(self, registry: dict[str, dict[str, list]]) -> None:
+        self._registry = registry
+        self._pending = []
+
+    def generate(self, output_dir: Optional[str] = None) -> list[str]:
+        """生成 proto 文件，默认写在每个模块的旁边，指定 output_dir 时都写入该目录
+
+        内容没有变化的 proto 不会重写，返回重写了的文件，compile 据此只编译变化的部分。
+        """
+        # 渲染依赖 jinja2，只在生成 proto 时导入，服务端和客户端的运行路径不需要
+        from pybantic.render import (
+            enums_render,
+            message_imports,
+            messages_render,
+            service_imports,
+            services_render,
+            package_render,
+        )
 
-    def generate(self) -> None:
+        written = []
         for file_path, elements in self.registry.items():
-            element_list = []
+            element_list, imports = [], []
             for element_type, elements in elements.items():
                 if element_type == "message":
                     element_list += messages_render(elements)
+                    imports += message_imports(elements)
                 elif element_type == "service":
                     element_list += services_render(elements)
+                    imports += service_imports(elements)
                 elif element_type == "enum":
                     element_list += enums_render(elements)
                 else:
                     raise ValueError(f"Unsupported element type: {element_type}")
 
-            package_name = os.path.basename(file_path).replace(".py", "")
-            package = package_render(package_name, element_list)
-            target_path = file_path.replace(".py", ".proto")
+            package = package_name(file_path)
+            rendered = package_render(package, element_list, sorted(set(imports)))
+            if output_dir is None:
+                target_path = file_path.replace(".py", ".proto")
+            else:
+                target_path = os.path.join(output_dir, f"{package}.proto")
+            # 保留未变化文件的修改时间，避免重新编译它和导入它的 proto
+            if os.path.exists(target_path):
+                with open(target_path) as f:
+                    if f.read() == rendered:
+                        continue
             with open(target_path, "w") as f:
-                f.write(package)
-
-    def compile(self) -> None:
-        for file_path, elements in self.registry.items():
-            target_dir = os.path.dirname(file_path)
-            build_package_protos(package_root=target_dir)
-
-    def _register_available_services(self):
-        for file_path, elements in self.registry.items():
-            for element_type, elements in elements.items():
-                if element_type == "service":
-                    for element in elements:
-                        source_file = inspect.getfile(element)
-                        filename = os.path.splitext(os.path.basename(source_file))[0]
-                        pb2_grpc_module_name = f"{filename}_pb2_grpc"
-
-                        svccls = importlib.import_module(pb2_grpc_module_name)
-                        basecls = getattr(svccls, f"{element.__name__}Servicer")
-                        ServiceAdapter = self._create_service_adapter(element, basecls)
-                        service_adapter = ServiceAdapter()
-
-                        add_to_server = getattr(
-                            svccls,
-                            f"add_{element.__name__}Servicer_to_server",
-                        )
-                        add_to_server(service_adapter, self.server)
+                f.write(rendered)
+            written.append(target_path)
+        return written
+
+    def compile(self, output_dir: Optional[str] = None) -> list[str]:
+        """编译过期的 proto 以及导入了它们的 proto，返回编译过的文件名"""
+        from pybantic.build import compile_protos
+
+        if output_dir is not None:
+            return compile_protos(output_dir, strict=True)
+        compiled = []
+        for target_dir in sorted({os.path.dirname(path) for path in self.registry}):
+            compiled += compile_protos(target_dir)
+        return compiled
+
+    def load_build(self) -> None:
+        """检查 build_dir 中的构建产物和当前的 schema 一致，只检查一次
+
+        注册服务时自动调用，只使用客户端的进程可以在启动时调用。
+        """
+        if self.build_dir is None or self._build_verified:
+            return
+        from pybantic.build import verify_build
+
+        verify_build(self, self.build_dir)
+        self._build_verified = True
+
+    def _register_available_services(self, server=None):
+        self.load_build()
+        server = self.server if server is None else server
+        wrappers: list[HandlerWrapper] = []
+        if self.capture is not None:
+            if self.capture_writer is None:
+                self.capture_writer = CaptureWriter(self.capture)
+            writer = self.capture_writer
+            wrappers.append(
+                lambda method, handler: capturing_handler(handler, method, writer)
+            )
+        if self.slow_calls is not None:
+            server.add_generic_rpc_handlers((admin_handler(self.slow_calls),))
+        self._add_services(server, wrappers)
+
+    def _add_services(self, server, wrappers: Iterable[HandlerWrapper] = ()) -> None:
+        """把所有服务的方法处理器加入 server，再依次用 wrappers 包装
+
+        只构建处理器，不创建录制文件、不注册管理服务，进程内调用用它查找处理器。
+        """
+        self.load_build()
+        handler_wrappers: list[HandlerWrapper] = []
+        if self.message_pool is not None:
+            pool = self.message_pool
+            handler_wrappers.append(
+                lambda method, handler: pooled_handler(handler, pool)
+            )
+        handler_wrappers.extend(wrappers)
+        server = _WrappedServer(server, handler_wrappers)
+        for element in self._services():
+            pb2_grpc_module_name = f"{source_package(element)}_pb2_grpc"
+
+            svccls = importlib.import_module(pb2_grpc_module_name)
+            basecls = getattr(svccls, f"{element.__name__}Servicer")
+            ServiceAdapter = self._create_service_adapter(element, basecls)
+            service_adapter = ServiceAdapter()
+
+            add_to_server = getattr(
+                svccls,
+                f"add_{element.__name__}Servicer_to_server",
+            )
+            add_to_server(service_adapter, server)
+
+    def _services(self) -> list[type]:
+        return [
+            element
+            for elements in self.registry.values()
+            for element in elements.get("service", ())
+        ]
+
+    def warmup(
+        self, requests: Optional[dict[str, Callable[[], BaseModel]]] = None
+    ) -> dict[str, float]:
+        """预热所有暴露的方法，返回每个方法的耗时（秒）
+
+        导入 pb2 模块，构建请求和响应（包括嵌套的消息）的转换计划，并解码一次空请求；
+        requests 为 "Service/method" 到请求工厂的映射，其中的方法再以工厂返回的请求
+        完整地走一遍序列化、解码、服务方法、编码和序列化。预热调用不经过注册的处理器，
+        不计入指标、钩子、慢调用和录制，也不使用消息池。
+        """
+        requests = requests or {}
+        timings = {}
+        for element in self._services():
+            for method_name, info in _exposed_methods(element).items():
+                label = f"{element.__name__}/{method_name}"
+                started = time.perf_counter()
+                request_type = info["request_type"]
+                warm_converters(request_type)
+                warm_converters(info["response_type"])
+                try:
+                    convert_from_protobuf(request_type, _message_class(request_type)())
+                except ValueError:
+                    # 空请求不一定能通过校验
+                    pass
+                factory = requests.get(label)
+                if factory is not None:
+                    payload = convert_to_protobuf(factory()).SerializeToString()
+                    request = convert_from_protobuf(
+                        request_type, _message_class(request_type).FromString(payload)
+                    )
+                    response = info["method"](element(), request=request)
+                    mask_field = info["field_mask"]
+                    convert_to_protobuf(
+                        response, getattr(request, mask_field) if mask_field else None
+                    ).SerializeToString()
+                timings[label] = time.perf_counter() - started
+        return timings
+
+    def _serve_method(
+        self,
+        user_method: Callable,
+        label: str,
+        decode: Callable[[Any], Any],
+        encode: Callable[[Any, Any], Any],
+        measure: Callable[[Any], Optional[int]],
+    ) -> Callable[[Any, Any, grpc.ServicerContext], Any]:
+        """服务端处理一次调用，网络调用和进程内直连共用
+
+        decode 把收到的请求转换为服务方法的 pydantic 请求，encode 以 (pydantic 请求, 响应)
+        得到返回给调用方的响应，measure 返回请求或响应的字节数；
+        各阶段计入指标和钩子，服务方法抛出异常时状态码为 INTERNAL。
+        """
+        metrics = self.metrics
+        hooks = self.hooks
+
+        def serve(service, request, context):
+            phases = {}
+            code = grpc.StatusCode.OK
+            response = None
+            request_bytes = measure(request)
+            call = (
+                hooks.start("server", label, request_bytes, phases, request)
+                if hooks is not None
+                else None
+            )
+            started = time.perf_counter()
+            try:
+                if call is not None:
+                    hooks.phase_started(call, "decode")
+                pydantic_request = decode(request)
+                decoded = time.perf_counter()
+                phases["decode"] = decoded - started
+                if call is not None:
+                    hooks.phase_finished(call, "decode", phases["decode"])
+                    hooks.phase_started(call, "handler")
+                    decoded = time.perf_counter()
+
+                # 调用用户方法
+                pydantic_response = user_method(service, request=pydantic_request)
+                handled = time.perf_counter()
+                phases["handler"] = handled - decoded
+                if call is not None:
+                    hooks.phase_finished(call, "handler", phases["handler"])
+                    hooks.phase_started(call, "encode")
+                    handled = time.perf_counter()
+
+                response = encode(pydantic_request, pydantic_response)
+                phases["encode"] = time.perf_counter() - handled
+                if call is not None:
+                    hooks.phase_finished(call, "encode", phases["encode"])
+
+                return response
+            except Exception as e:
+                code = grpc.StatusCode.INTERNAL
+                context.set_code(code)
+                context.set_details(f"Internal error: {str(e)}")
+                raise e
+            finally:
+                response_bytes = measure(response) if response is not None else None
+                metrics.observe_call(
+                    "server",
+                    label,
+                    phases,
+                    code,
+                    request_bytes=request_bytes,
+                    response_bytes=response_bytes,
+                )
+                if call is not None:
+                    call.code = code
+                    call.response_bytes = response_bytes
+                    hooks.call_finished(call)
+
+        return serve
 
     def _create_service_adapter(self, element, basecls):
         """创建服务适配器，将 gRPC 调用适配到用户定义的 pydantic 方法"""
 
-        # 获取用户服务类的实例
-        user_service = element
-
-        # 收集所有暴露的方法及其类型信息
-        exposed_methods = {}
-        for attr_name in dir(user_service):
-            attr = getattr(user_service, attr_name)
-            if (
-                hasattr(attr, "__pybantic_type__")
-                and attr.__pybantic_type__ == "method"
-            ):
-                # 获取方法的类型注解
-                signature = inspect.signature(attr)
-                params = list(signature.parameters.values())
-                if len(params) >= 2:  # self + request
-                    request_type = params[1].annotation
-                    response_type = signature.return_annotation
-                    exposed_methods[attr_name] = {
-                        "method": attr,
-                        "request_type": request_type,
-                        "response_type": response_type,
-                    }
+        request_decode_cache = self.request_decode_cache
+        message_pool = self.message_pool
 
         class ServiceAdapter(basecls):
             def __init__(self):
                 super().__init__()
 
         # 动态为每个暴露的方法创建适配器
-        for method_name, method_info in exposed_methods.items():
-
-            def create_adapter_method(user_method, req_type, resp_type):
-                def adapter_method(self, request, context):
-                    try:
-                        # 将 protobuf request 转换为 pydantic model
-                        pydantic_request = convert_from_protobuf(req_type, request)
-
-                        # 调用用户方法
-                        pydantic_response = user_method(self, request=pydantic_request)
-
-                        # 将 pydantic response 转换为 protobuf message
-                        protobuf_response = convert_to_protobuf(pydantic_response)
-
-                        return protobuf_response
-                    except Exception as e:
-                        context.set_code(grpc.StatusCode.INTERNAL)
-                        context.set_details(f"Internal error: {str(e)}")
-                        raise e
-
-                return adapter_method
+        for method_name, method_info in _exposed_methods(element).items():
+
+            def create_adapter_method(user_method, req_type, label, mask_field):
+                def decode(request):
+                    # 将 protobuf request 转换为 pydantic model
+                    with decode_cache() if request_decode_cache else nullcontext():
+                        return convert_from_protobuf(req_type, request)
+
+                def encode(request, response):
+                    # 将 pydantic response 转换为 protobuf message，
+                    # 请求中带有字段掩码时只转换掩码中的字段
+                    field_mask = getattr(request, mask_field) if mask_field else None
+                    return convert_to_protobuf(response, field_mask, pool=message_pool)
+
+                return self._serve_method(
+                    user_method,
+                    label,
+                    decode,
+                    encode,
+                    lambda message: message.ByteSize(),
+                )
 
             # 将适配器方法绑定到 ServiceAdapter 类
             adapter_method = create_adapter_method(
                 method_info["method"],
                 method_info["request_type"],
-                method_info["response_type"],
+                f"{element.__name__}/{method_name}",
+                method_info["field_mask"],
             )
             setattr(ServiceAdapter, method_name, adapter_method)
 
         return ServiceAdapter
 
-    def run(self, port: int = 50051) -> None:
+    def _model_method(
+        self, element: type, method_name: str
+    ) -> Callable[[Any, BaseModel, grpc.ServicerContext], Any]:
+        """进程内直连时的服务端处理，以 (服务实例, pydantic 请求, context) 调用
+
+        和网络调用一致：服务方法拿到请求的副本，修改不会影响调用方；
+        lite 方法以轻量模型接收请求并返回轻量模型；响应按字段掩码裁剪；
+        计入服务端的指标、钩子和慢调用。没有 protobuf，请求和响应的字节数为 None，
+        也不经过录制和消息池。响应不复制，直接交给调用方。
+        """
+        info = _exposed_methods(element)[method_name]
+        mask_field = info["field_mask"]
+        lite = getattr(info["method"], "__pybantic_lite__", False)
+
+        def decode(request):
+            request = copy.deepcopy(request)
+            if lite and isinstance(request, BaseModel):
+                request = lite_model(request.__class__).from_full(request)
+            return request
+
+        def encode(request, response):
+            if lite and isinstance(response, BaseModel):
+                response = lite_model(response.__class__).from_full(response)
+            if mask_field:
+                response = mask_model(response, getattr(request, mask_field))
+            return response
+
+        return self._serve_method(
+            info["method"],
+            f"{element.__name__}/{method_name}",
+            decode,
+            encode,
+            lambda value: None,
+        )
+
+    def run(
+        self,
+        port: int = 50051,
+        warmup: bool = True,
+        warmup_requests: Optional[dict[str, Callable[[], BaseModel]]] = None,
+    ) -> None:
+        """预热之后再监听端口，避免部署后的第一批请求承担导入和构建转换计划的开销"""
         self._register_available_services()
+        if warmup:
+            started = time.perf_counter()
+            for label, seconds in self.warmup(warmup_requests).items():
+                print(f"Warmed up {label} in {seconds * 1000:.1f}ms")
+            print(f"Warmup finished in {(time.perf_counter() - started) * 1000:.1f}ms")
         self.server.add_insecure_port(f"[::]:{port}")
         self.server.start()
+        self.ready.set()
         print(f"Server started on port {port}")
-        self.server.wait_for_termination()
+        try:
+            self.server.wait_for_termination()
+        finally:
+            if self.capture_writer is not None:
+                self.capture_writer.close()
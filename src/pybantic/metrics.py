@@ -0,0 +1,153 @@
+import bisect
+import threading
+from typing import Iterable, Optional
+
+import grpc
+
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+SIZE_BUCKETS: tuple[float, ...] = tuple(4.0**i for i in range(2, 14))
+
+
+class Histogram:
+    """固定桶的直方图"""
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, q: float) -> float:
+        """按桶的上界估算分位数，落在最后一个桶时返回最大的桶边界"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = total * q / 100
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "buckets": dict(zip([*self.buckets, float("inf")], self.counts)),
+            }
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def incr(self, value: int = 1) -> None:
+        with self._lock:
+            self.value += value
+
+
+class MetricsRegistry:
+    """客户端和服务端共用的指标注册表，指标以 (名称, 标签) 区分"""
+
+    def __init__(self) -> None:
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+        self._counters: dict[tuple[str, tuple], Counter] = {}
+        self._lock = threading.Lock()
+
+    def histogram(
+        self,
+        name: str,
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+        **labels: str,
+    ) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def observe_call(
+        self,
+        side: str,
+        method: str,
+        phases: dict[str, float],
+        code: grpc.StatusCode,
+        request_bytes: Optional[int] = None,
+        response_bytes: Optional[int] = None,
+    ) -> None:
+        """记录一次调用：各阶段耗时（秒）、请求和响应的字节数以及状态码"""
+        for phase, seconds in phases.items():
+            self.histogram(f"{side}_{phase}_seconds", method=method).observe(seconds)
+        if request_bytes is not None:
+            self.histogram(
+                f"{side}_request_bytes", SIZE_BUCKETS, method=method
+            ).observe(request_bytes)
+        if response_bytes is not None:
+            self.histogram(
+                f"{side}_response_bytes", SIZE_BUCKETS, method=method
+            ).observe(response_bytes)
+        self.counter(f"{side}_calls_total", method=method, code=code.name).incr()
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        result: dict[str, list[dict]] = {}
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+        for (name, labels), histogram in histograms:
+            result.setdefault(name, []).append(
+                {"labels": dict(labels), **histogram.as_dict()}
+            )
+        for (name, labels), counter in counters:
+            result.setdefault(name, []).append(
+                {"labels": dict(labels), "value": counter.value}
+            )
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# 默认的全局注册表，Pybantic 和 gRPCClient 未指定时都使用它
+default_registry = MetricsRegistry()
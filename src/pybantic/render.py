@@ -1,8 +1,11 @@
 import inspect
+import re
 import typing
 from pydantic import BaseModel
 from pydantic.fields import FieldInfo
 
+from pybantic.enums import enum_numbers
+from pybantic.sources import source_package
 from pybantic._templates import (
     EnumItemTemplate,
     EnumTemplate,
@@ -15,15 +18,32 @@ from pybantic._templates import (
     ServiceTemplate,
 )
 from pybantic.types import (
+    get_array_type,
+    get_oneof_field_name,
+    get_oneof_types,
+    get_optional_type,
     get_scalar_type,
+    get_well_known_type,
+    is_array_type,
     is_enum_type,
     is_map_type,
     is_message_type,
     is_method_type,
+    is_oneof_type,
     is_scalar_type,
+    is_union_type,
+    is_well_known_type,
 )
 
 
+def type_reference(annotation, package: str | None = None) -> str:
+    """在 package 中引用消息或枚举时使用的类型名，定义在其他 package 中时加上限定"""
+    other = source_package(annotation)
+    if package is None or other == package:
+        return annotation.__name__
+    return f"{other}.{annotation.__name__}"
+
+
 def scalar_type_render(index, name, field_info, label: str | None = None) -> str:
     if not is_scalar_type(field_info.annotation):
         raise ValueError(f"Unsupported scalar type: {field_info.annotation}")
@@ -43,7 +63,9 @@ def scalar_type_render(index, name, field_info, label: str | None = None) -> str
     ).render()
 
 
-def message_type_render(index, name, field_info, label: str | None = None) -> str:
+def message_type_render(
+    index, name, field_info, label: str | None = None, package: str | None = None
+) -> str:
     if not is_message_type(field_info.annotation):
         raise ValueError(f"Unsupported message type: {field_info.annotation}")
 
@@ -51,18 +73,20 @@ def message_type_render(index, name, field_info, label: str | None = None) -> st
         return LabelFieldTemplate(
             index=index,
             name=name,
-            type=field_info.annotation.__name__,
+            type=type_reference(field_info.annotation, package),
             label=label,
         ).render()
 
     return FieldTemplate(
         index=index,
         name=name,
-        type=field_info.annotation.__name__,
+        type=type_reference(field_info.annotation, package),
     ).render()
 
 
-def enum_type_render(index, name, field_info, label: str | None = None) -> str:
+def enum_type_render(
+    index, name, field_info, label: str | None = None, package: str | None = None
+) -> str:
     if not is_enum_type(field_info.annotation):
         raise ValueError(f"Unsupported enum type: {field_info.annotation}")
 
@@ -70,18 +94,51 @@ def enum_type_render(index, name, field_info, label: str | None = None) -> str:
         return LabelFieldTemplate(
             index=index,
             name=name,
-            type=field_info.annotation.__name__,
+            type=type_reference(field_info.annotation, package),
             label=label,
         ).render()
 
     return FieldTemplate(
         index=index,
         name=name,
-        type=field_info.annotation.__name__,
+        type=type_reference(field_info.annotation, package),
     ).render()
 
 
-def map_type_render(index, name, field_info) -> str:
+def well_known_type_render(index, name, field_info, label: str | None = None) -> str:
+    if not is_well_known_type(field_info.annotation):
+        raise ValueError(f"Unsupported well-known type: {field_info.annotation}")
+
+    type_name, _ = get_well_known_type(field_info.annotation)
+    if label:
+        return LabelFieldTemplate(
+            index=index,
+            name=name,
+            type=type_name,
+            label=label,
+        ).render()
+
+    return FieldTemplate(
+        index=index,
+        name=name,
+        type=type_name,
+    ).render()
+
+
+def array_type_render(index, name, field_info) -> str:
+    if not is_array_type(field_info.annotation):
+        raise ValueError(f"Unsupported array type: {field_info.annotation}")
+
+    # proto3 中标量的 repeated 字段默认就是 packed 编码
+    return LabelFieldTemplate(
+        index=index,
+        name=name,
+        type=get_array_type(field_info.annotation),
+        label="repeated",
+    ).render()
+
+
+def map_type_render(index, name, field_info, package: str | None = None) -> str:
     args = typing.get_args(field_info.annotation)
     key_type, value_type = args[0], args[1]
     if not is_map_type(key_type, value_type):
@@ -90,7 +147,7 @@ def map_type_render(index, name, field_info) -> str:
     value_type_str = (
         get_scalar_type(value_type)
         if is_scalar_type(value_type)
-        else value_type.__name__
+        else type_reference(value_type, package)
     )
     type_str = f"map<{key_type_str}, {value_type_str}>"
     return FieldTemplate(
@@ -100,29 +157,27 @@ def map_type_render(index, name, field_info) -> str:
     ).render()
 
 
-def none_type_render(index, name, field_info) -> str:
-    return FieldTemplate(
-        index=index,
-        name=name,
-        type="string",
-    ).render()
-
-
-def oneof_type_render(index, name, field_info) -> str:
-    args = typing.get_args(field_info.annotation)
+def oneof_type_render(index, name, field_info, package: str | None = None) -> str:
     oneof_fields = []
-    for jndex, arg in enumerate(args, start=1):
-        index = index * 10_000 + jndex
+    for jndex, arg in enumerate(get_oneof_types(field_info.annotation), start=1):
+        # 每个分支使用独立的字段名和编号，编号不会和普通字段冲突
+        arm_index = index * 10_000 + jndex
+        arm_name = get_oneof_field_name(name, arg)
+        arm_info = FieldInfo(annotation=arg)
         if is_scalar_type(arg):
-            oneof_field = scalar_type_render(index, name, FieldInfo(annotation=arg))
-        if is_message_type(arg):
-            oneof_field = message_type_render(index, name, FieldInfo(annotation=arg))
-        if is_enum_type(arg):
-            oneof_field = enum_type_render(index, name, FieldInfo(annotation=arg))
-        if isinstance(None, arg):
-            oneof_field = none_type_render(index, name, FieldInfo(annotation=arg))
+            oneof_field = scalar_type_render(arm_index, arm_name, arm_info)
+        elif is_message_type(arg):
+            oneof_field = message_type_render(
+                arm_index, arm_name, arm_info, package=package
+            )
+        elif is_enum_type(arg):
+            oneof_field = enum_type_render(
+                arm_index, arm_name, arm_info, package=package
+            )
+        elif is_well_known_type(arg):
+            oneof_field = well_known_type_render(arm_index, arm_name, arm_info)
         else:
-            raise ValueError(f"Unsupported type: {arg}")
+            raise ValueError(f"Unsupported oneof type: {arg}")
         oneof_fields.append(oneof_field)
     return OneOfTemplate(
         name=name,
@@ -130,16 +185,28 @@ def oneof_type_render(index, name, field_info) -> str:
     ).render()
 
 
-def field_render(index, name, field_info: FieldInfo) -> str:
+def field_render(
+    index, name, field_info: FieldInfo, package: str | None = None
+) -> str:
+    # Optional 标量和 dict[str, Any] 需要在 Union 和 dict 之前判断
+    if is_well_known_type(field_info.annotation):
+        return well_known_type_render(index, name, field_info)
+    if is_oneof_type(field_info.annotation):
+        return oneof_type_render(index, name, field_info, package=package)
+    optional = get_optional_type(field_info.annotation)
+    if optional is not None:
+        return field_render(index, name, FieldInfo(annotation=optional), package)
     typing_origin = typing.get_origin(field_info.annotation)
     typing_args = typing.get_args(field_info.annotation)
     if not typing_origin:
         if is_scalar_type(field_info.annotation):
             return scalar_type_render(index, name, field_info)
         if is_message_type(field_info.annotation):
-            return message_type_render(index, name, field_info)
+            return message_type_render(index, name, field_info, package=package)
         if is_enum_type(field_info.annotation):
-            return enum_type_render(index, name, field_info)
+            return enum_type_render(index, name, field_info, package=package)
+        if is_array_type(field_info.annotation):
+            return array_type_render(index, name, field_info)
         raise ValueError(f"Unsupported origin type: {field_info.annotation}")
     if not typing_args:
         raise ValueError(
@@ -147,26 +214,34 @@ def field_render(index, name, field_info: FieldInfo) -> str:
         )
     if typing_origin is list:
         args0 = typing_args[0]
+        item_info = FieldInfo(annotation=args0)
         if is_scalar_type(args0):
-            return scalar_type_render(index, name, field_info, label="repeated")
+            return scalar_type_render(index, name, item_info, label="repeated")
         if is_message_type(args0):
-            return message_type_render(index, name, field_info, label="repeated")
+            return message_type_render(
+                index, name, item_info, label="repeated", package=package
+            )
         if is_enum_type(args0):
-            return enum_type_render(index, name, field_info, label="repeated")
+            return enum_type_render(
+                index, name, item_info, label="repeated", package=package
+            )
+        if is_well_known_type(args0):
+            return well_known_type_render(index, name, item_info, label="repeated")
         raise ValueError(f"Unsupported repeated type: {field_info.annotation}")
     if typing_origin is dict:
-        return map_type_render(index, name, field_info)
-    if typing_origin is typing.Union:
-        return oneof_type_render(index, name, field_info)
+        return map_type_render(index, name, field_info, package=package)
     raise ValueError(f"Unsupported type: {field_info.annotation}")
 
 
-def fields_render(field_infos: list[tuple[str, FieldInfo]]) -> list[str]:
+def fields_render(
+    field_infos: list[tuple[str, FieldInfo]], package: str | None = None
+) -> list[str]:
     return [
         field_render(
             index=index,
             name=name,
             field_info=field_info,
+            package=package,
         )
         for index, (name, field_info) in enumerate(
             field_infos,
@@ -182,7 +257,8 @@ def message_render(message: BaseModel):
         fields=fields_render(
             field_infos=list(
                 field_infos,
-            )
+            ),
+            package=source_package(message),
         ),
     ).render()
 
@@ -191,29 +267,70 @@ def messages_render(messages: list[BaseModel]) -> list[str]:
     return [message_render(message) for message in messages]
 
 
-def method_render(method):
-    annotations = inspect.get_annotations(method)
+def _annotation_import(annotation, package: str) -> str | None:
+    if is_well_known_type(annotation):
+        return get_well_known_type(annotation)[1]
+    if is_message_type(annotation) or is_enum_type(annotation):
+        other = source_package(annotation)
+        if other != package:
+            return f"{other}.proto"
+    return None
+
+
+def message_imports(messages: list[BaseModel]) -> list[str]:
+    """消息中用到的 well-known 类型和其他 package 的类型需要导入的 proto 文件"""
+    imports = set()
+    for message in messages:
+        package = source_package(message)
+        for field_info in message.__pydantic_fields__.values():
+            annotation = field_info.annotation
+            if is_well_known_type(annotation):
+                annotations = [annotation]
+            elif typing.get_origin(annotation) is list:
+                annotations = [typing.get_args(annotation)[0]]
+            elif typing.get_origin(annotation) is dict:
+                annotations = [typing.get_args(annotation)[1]]
+            elif is_union_type(annotation):
+                annotations = get_oneof_types(annotation)
+            else:
+                annotations = [annotation]
+            for annotation in annotations:
+                imported = _annotation_import(annotation, package)
+                if imported is not None:
+                    imports.add(imported)
+    return sorted(imports)
+
+
+def _method_types(method):
+    annotations = dict(inspect.get_annotations(method))
     response = annotations.pop("return")
     request = annotations.popitem()[1]
+    return request, response
+
+
+def _service_methods(service):
+    return [
+        method
+        for _, method in inspect.getmembers(service, inspect.isfunction)
+        if is_method_type(method)
+    ]
+
+
+def method_render(method, package: str | None = None):
+    request, response = _method_types(method)
     return MethodTemplate(
         name=method.__name__,
-        request=request.__name__,
-        response=response.__name__,
+        request=type_reference(request, package),
+        response=type_reference(response, package),
     ).render()
 
 
-def methods_render(methods):
-    return [method_render(method) for method in methods]
+def methods_render(methods, package: str | None = None):
+    return [method_render(method, package) for method in methods]
 
 
 def service_render(service):
-    methods = methods_render(
-        [
-            method
-            for _, method in inspect.getmembers(service, inspect.isfunction)
-            if is_method_type(method)
-        ]
-    )
+    methods = methods_render(_service_methods(service), source_package(service))
     return ServiceTemplate(
         name=service.__name__,
         methods=methods,
@@ -224,6 +341,19 @@ def services_render(services):
     return [service_render(service) for service in services]
 
 
+def service_imports(services) -> list[str]:
+    """服务的请求和响应定义在其他 package 中时需要导入的 proto 文件"""
+    imports = set()
+    for service in services:
+        package = source_package(service)
+        for method in _service_methods(service):
+            for annotation in _method_types(method):
+                imported = _annotation_import(annotation, package)
+                if imported is not None:
+                    imports.add(imported)
+    return sorted(imports)
+
+
 def enum_item_render(index, name):
     return EnumItemTemplate(
         name=name,
@@ -232,20 +362,26 @@ def enum_item_render(index, name):
 
 
 def enum_items_render(enum):
-    return [
-        enum_item_render(index, name)
-        for index, (name, _) in enumerate(
-            iterable=enum.__members__.items(),
-            start=1,
-        )
-    ]
+    numbers = enum_numbers(enum)
+    # proto3 要求枚举的第一个值为 0，编号为 0 的成员不论定义在哪里都排在最前面
+    items = sorted(enum.__members__.items(), key=lambda item: numbers[item[1]] != 0)
+    return [enum_item_render(numbers[member], name) for name, member in items]
+
+
+def enum_unspecified_name(enum):
+    # 同一个 package 中枚举值的名字必须唯一，默认值带上枚举名作为前缀
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", enum.__name__).upper() + "_UNSPECIFIED"
 
 
 def enum_render(enum):
+    numbers = enum_numbers(enum)
     items = enum_items_render(enum)
     return EnumTemplate(
         name=enum.__name__,
         items=items,
+        unspecified=enum_unspecified_name(enum),
+        allow_alias=len(enum.__members__) > len(numbers),
+        has_zero=0 in numbers.values(),
     ).render()
 
 
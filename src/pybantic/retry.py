@@ -0,0 +1,246 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+import grpc
+from pydantic import BaseModel
+
+
+class RetryPolicy(BaseModel):
+    """按状态码重试的策略，退避时间按指数增长并带随机抖动"""
+
+    max_attempts: int = 3
+    initial_backoff: float = 0.1
+    max_backoff: float = 5.0
+    backoff_multiplier: float = 2.0
+    jitter: float = 0.2
+    retryable_status_codes: set[grpc.StatusCode] = {grpc.StatusCode.UNAVAILABLE}
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败之后的等待时间（秒）"""
+        backoff = min(
+            self.initial_backoff * self.backoff_multiplier ** (attempt - 1),
+            self.max_backoff,
+        )
+        return backoff * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class HedgingPolicy(BaseModel):
+    """对冲请求策略，只能用于幂等的方法
+
+    第一次请求在历史延迟的 percentile 分位数之内没有返回时，再发出一次请求，
+    以先成功返回的结果为准。历史样本不足 min_samples 时使用 initial_delay。
+    """
+
+    max_attempts: int = 2
+    percentile: float = 95.0
+    initial_delay: float = 0.05
+    min_samples: int = 20
+    window: int = 1000
+    non_fatal_status_codes: set[grpc.StatusCode] = {grpc.StatusCode.UNAVAILABLE}
+
+
+class RetryBudget:
+    """令牌桶形式的重试预算，防止下游故障时出现重试风暴
+
+    每次失败消耗一个令牌，每次成功归还 token_ratio 个令牌，
+    令牌数低于 max_tokens 的一半时不再重试或对冲。
+    """
+
+    def __init__(self, max_tokens: float = 10.0, token_ratio: float = 0.1) -> None:
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.tokens = min(self.tokens + self.token_ratio, self.max_tokens)
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.tokens = max(self.tokens - 1, 0.0)
+
+    def allow_retry(self) -> bool:
+        with self._lock:
+            return self.tokens > self.max_tokens / 2
+
+
+class RetryStats:
+    """单个方法的重试计数"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.budget_exhausted,
+        }
+
+
+class LatencyTracker:
+    """记录最近的调用延迟，用于计算对冲请求的等待时间"""
+
+    def __init__(self, window: int = 1000) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def delay(self, policy: HedgingPolicy) -> float:
+        with self._lock:
+            if len(self._samples) < policy.min_samples:
+                return policy.initial_delay
+            samples = sorted(self._samples)
+        index = min(int(len(samples) * policy.percentile / 100), len(samples) - 1)
+        return samples[index]
+
+
+def _status_code(error: BaseException) -> grpc.StatusCode | None:
+    code = getattr(error, "code", None)
+    return code() if callable(code) else None
+
+
+def call_with_retry(
+    policy: RetryPolicy,
+    budget: RetryBudget,
+    stats: RetryStats,
+    tracker: LatencyTracker,
+    func: Callable[..., Any],
+    *args,
+    **kwargs,
+) -> Any:
+    stats.incr("calls")
+    # 调用方的 timeout 是所有尝试共用的截止时间，每次尝试只使用剩余的时间
+    timeout = kwargs.get("timeout")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    attempt = 0
+    while True:
+        attempt += 1
+        stats.incr("attempts")
+        if deadline is not None:
+            kwargs["timeout"] = deadline - time.monotonic()
+        started = time.perf_counter()
+        try:
+            response = func(*args, **kwargs)
+        except grpc.RpcError as e:
+            if _status_code(e) not in policy.retryable_status_codes:
+                # 不可重试的错误（如 INVALID_ARGUMENT）不消耗重试预算
+                raise
+            budget.on_failure()
+            if attempt >= policy.max_attempts:
+                raise
+            if not budget.allow_retry():
+                stats.incr("budget_exhausted")
+                raise
+            backoff = policy.backoff(attempt)
+            if deadline is not None and time.monotonic() + backoff >= deadline:
+                raise
+            stats.incr("retries")
+            time.sleep(backoff)
+            continue
+        budget.on_success()
+        tracker.record(time.perf_counter() - started)
+        return response
+
+
+def call_with_hedging(
+    policy: HedgingPolicy,
+    budget: RetryBudget,
+    stats: RetryStats,
+    tracker: LatencyTracker,
+    multicallable: Any,
+    request: Any,
+    **kwargs,
+) -> Any:
+    """用 multicallable.future 并发发出请求，返回最先成功的响应"""
+    stats.incr("calls")
+    started = time.perf_counter()
+    done = threading.Condition()
+    attempts: list[Any] = []
+    # 和 call_with_retry 一样，对冲的请求只使用调用方 timeout 剩余的时间
+    timeout = kwargs.get("timeout")
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def notify(_) -> None:
+        with done:
+            done.notify_all()
+
+    def launch() -> None:
+        stats.incr("attempts")
+        if deadline is not None:
+            kwargs["timeout"] = max(deadline - time.monotonic(), 0.0)
+        future = multicallable.future(request, **kwargs)
+        attempts.append(future)
+        future.add_done_callback(notify)
+
+    delay = tracker.delay(policy)
+    winner, errors, hedging = None, [], True
+    with done:
+        launch()
+        hedge_at = time.monotonic() + delay
+        while True:
+            failed = []
+            for index, future in enumerate(attempts):
+                if not future.done():
+                    continue
+                if future.exception() is None:
+                    winner = index
+                    break
+                failed.append(future.exception())
+            if winner is not None:
+                break
+            for _ in failed[len(errors) :]:
+                budget.on_failure()
+            errors = failed
+            if any(_status_code(e) not in policy.non_fatal_status_codes for e in errors):
+                break
+
+            pending = len(attempts) - len(errors)
+            hedging = hedging and len(attempts) < policy.max_attempts
+            if hedging and (not pending or time.monotonic() >= hedge_at):
+                if budget.allow_retry():
+                    stats.incr("hedges")
+                    launch()
+                    hedge_at = time.monotonic() + delay
+                    continue
+                stats.incr("budget_exhausted")
+                hedging = False
+            if not pending:
+                break
+            done.wait(max(hedge_at - time.monotonic(), 0) if hedging else None)
+
+    for index, future in enumerate(attempts):
+        if index != winner:
+            future.cancel()
+
+    if winner is None:
+        raise next(
+            (e for e in errors if _status_code(e) not in policy.non_fatal_status_codes),
+            errors[-1],
+        )
+
+    budget.on_success()
+    tracker.record(time.perf_counter() - started)
+    if winner > 0:
+        stats.incr("hedge_wins")
+    return attempts[winner].result()
@@ -1,11 +1,13 @@
 from __future__ import annotations
 import inspect
-from functools import wraps
+from functools import partial, wraps
 import os
 from pydantic import BaseModel
-from typing import TYPE_CHECKING, Callable, TypeAlias, TypeVar
+from typing import TYPE_CHECKING, Callable, Optional, TypeAlias, TypeVar
 from google.protobuf.message import Message
 
+from pybantic.batch import batch_method
+
 if TYPE_CHECKING:
     from pybantic.main import Pybantic
 
@@ -33,6 +35,20 @@ def service(
 
     def decorator(target_cls: type[T]) -> type[T]:
         setattr(target_cls, "__pybantic_type__", "service")
+        for name, method in list(vars(target_cls).items()):
+            if getattr(method, "__pybantic_batch__", False):
+                annotations = inspect.get_annotations(method)
+                setattr(
+                    target_cls,
+                    f"{name}_batch",
+                    batch_method(
+                        target_cls,
+                        method,
+                        annotations["request"],
+                        annotations["return"],
+                        pb,
+                    ),
+                )
         pb.register(target_cls)
 
         return target_cls
@@ -47,11 +63,22 @@ def service(
 
 
 def expose(
-    method: Callable[[T, ModelRequest], ModelResponse],
-) -> Callable[
-    [T, ModelRequest],
-    ModelResponse,
-]:
+    method: Callable[[T, ModelRequest], ModelResponse] | None = None,
+    /,
+    *,
+    batch: bool = False,
+    field_mask: Optional[str] = None,
+    lite: bool = False,
+) -> (
+    Callable[[T, ModelRequest], ModelResponse]
+    | Callable[
+        [Callable[[T, ModelRequest], ModelResponse]],
+        Callable[[T, ModelRequest], ModelResponse],
+    ]
+):
+    if method is None:
+        return partial(expose, batch=batch, field_mask=field_mask, lite=lite)
+
     parameters = inspect.signature(method).parameters
 
     assert len(parameters) == 2, (
@@ -73,6 +100,11 @@ def expose(
     )
 
     setattr(method, "__pybantic_type__", "method")
+    setattr(method, "__pybantic_batch__", batch)
+    # 请求中 FieldMask 字段的名字，响应只转换掩码中的字段
+    setattr(method, "__pybantic_field_mask__", field_mask)
+    # 服务端以轻量模型接收请求，客户端以轻量模型接收响应
+    setattr(method, "__pybantic_lite__", lite)
 
     @wraps(method)
     def decorator(self: T, request: ModelRequest) -> ModelResponse:
@@ -0,0 +1,172 @@
+import heapq
+import itertools
+import json
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import unquote
+
+import grpc
+from google.protobuf.message import Message
+from pydantic import BaseModel
+
+from pybantic.hooks import CallInfo, Hook
+
+ADMIN_SERVICE = "pybantic.Admin"
+SLOW_CALLS_METHOD = f"/{ADMIN_SERVICE}/SlowCalls"
+
+
+class SlowCallPolicy(BaseModel):
+    """慢调用采样策略
+
+    每个方法保留最近 window 秒内最慢的 per_method 次调用，窗口分成 slices 个时间片滑动；
+    比 min_seconds 快的调用不记录，请求快照最多保留 snapshot_chars 个字符。
+    """
+
+    per_method: int = 10
+    window: float = 60.0
+    slices: int = 6
+    min_seconds: float = 0.0
+    snapshot_chars: int = 1024
+
+
+class SlowCall(BaseModel):
+    method: str
+    timestamp: float
+    elapsed: float
+    phases: dict[str, float]
+    code: str
+    request_bytes: Optional[int] = None
+    response_bytes: Optional[int] = None
+    request: str = ""
+
+
+def _snapshot(request: Any, limit: int) -> str:
+    if request is None:
+        return ""
+    if isinstance(request, Message):
+        from google.protobuf import text_format
+
+        text = text_format.MessageToString(request, as_one_line=True)
+    else:
+        text = repr(request)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class SlowCallRecorder(Hook):
+    """按方法记录滑动窗口内最慢的调用，只有进入前 per_method 的调用才生成请求快照"""
+
+    def __init__(self, policy: Optional[SlowCallPolicy] = None) -> None:
+        self.policy = policy or SlowCallPolicy()
+        self._slice_seconds = self.policy.window / self.policy.slices
+        # 方法名 -> 时间片序号 -> 以耗时排序的小顶堆
+        self._slices: dict[str, dict[int, list[tuple[float, int, SlowCall]]]] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _heap(self, method: str, index: int) -> list[tuple[float, int, SlowCall]]:
+        # 调用方持有锁；新时间片开始时清理滑出窗口的时间片
+        slices = self._slices.setdefault(method, {})
+        heap = slices.get(index)
+        if heap is None:
+            heap = slices[index] = []
+            oldest = index - self.policy.slices
+            for expired in [key for key in slices if key <= oldest]:
+                del slices[expired]
+        return heap
+
+    def call_finished(self, call: CallInfo) -> None:
+        elapsed = call.elapsed
+        if elapsed < self.policy.min_seconds:
+            return
+        now = time.time()
+        index = int(now // self._slice_seconds)
+        with self._lock:
+            heap = self._heap(call.method, index)
+            if len(heap) >= self.policy.per_method and elapsed <= heap[0][0]:
+                return
+        # 快照在锁外生成，写入时重新取时间片，过期检查和写入在同一个锁内完成
+        entry = SlowCall(
+            method=call.method,
+            timestamp=now,
+            elapsed=elapsed,
+            phases=dict(call.phases),
+            code=call.code.name,
+            request_bytes=call.request_bytes,
+            response_bytes=call.response_bytes,
+            request=_snapshot(call.request, self.policy.snapshot_chars),
+        )
+        item = (elapsed, next(self._sequence), entry)
+        with self._lock:
+            heap = self._heap(call.method, index)
+            if len(heap) < self.policy.per_method:
+                heapq.heappush(heap, item)
+            elif elapsed > heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+    def slowest(self, method: Optional[str] = None) -> list[SlowCall]:
+        """窗口内每个方法最慢的调用，按耗时从大到小"""
+        oldest = int(time.time() // self._slice_seconds) - self.policy.slices
+        with self._lock:
+            methods = [method] if method is not None else list(self._slices)
+            items = [
+                item
+                for name in methods
+                for index, heap in self._slices.get(name, {}).items()
+                if index > oldest
+                for item in heap
+            ]
+        result: list[SlowCall] = []
+        counts: dict[str, int] = {}
+        for _, _, entry in sorted(items, key=lambda item: -item[0]):
+            if counts.get(entry.method, 0) < self.policy.per_method:
+                counts[entry.method] = counts.get(entry.method, 0) + 1
+                result.append(entry)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slices.clear()
+
+
+def _is_local_peer(peer: str) -> bool:
+    # IPv6 地址的方括号会被编码，如 ipv6:%5B::1%5D:50051
+    peer = unquote(peer)
+    return peer.startswith(("ipv4:127.", "ipv6:[::1]", "ipv6:[::ffff:127.", "unix:"))
+
+
+def admin_handler(recorder: SlowCallRecorder) -> grpc.GenericRpcHandler:
+    """以 JSON 编码请求和响应的管理服务，只接受本机的调用
+
+    SlowCalls 的请求为 {"method": "Service/method"}，省略 method 时返回所有方法。
+    """
+
+    def slow_calls(request: dict, context: grpc.ServicerContext) -> list:
+        if not _is_local_peer(context.peer()):
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "admin RPCs are local only")
+        entries = recorder.slowest(request.get("method"))
+        return [entry.model_dump() for entry in entries]
+
+    return grpc.method_handlers_generic_handler(
+        ADMIN_SERVICE,
+        {
+            "SlowCalls": grpc.unary_unary_rpc_method_handler(
+                slow_calls,
+                request_deserializer=lambda data: json.loads(data or b"{}"),
+                response_serializer=lambda value: json.dumps(value).encode(),
+            )
+        },
+    )
+
+
+def query_slow_calls(
+    channel: grpc.Channel, method: Optional[str] = None, timeout: float = 5.0
+) -> list[SlowCall]:
+    """通过管理服务查询服务端记录的慢调用"""
+    call = channel.unary_unary(
+        SLOW_CALLS_METHOD,
+        request_serializer=lambda value: json.dumps(value).encode(),
+        response_deserializer=json.loads,
+    )
+    request = {} if method is None else {"method": method}
+    return [SlowCall(**entry) for entry in call(request, timeout=timeout)]
@@ -0,0 +1,23 @@
+import inspect
+import os
+
+# 模块名 -> 源文件的绝对路径，同一个模块中的元素只查找一次
+_module_files: dict[str, str] = {}
+
+
+def source_file(element) -> str:
+    """定义消息、枚举或服务的源文件的绝对路径"""
+    module = element.__module__
+    path = _module_files.get(module)
+    if path is None:
+        path = _module_files[module] = inspect.getabsfile(element)
+    return path
+
+
+def package_name(file_path: str) -> str:
+    """源文件对应的 proto package，即不带扩展名的文件名"""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def source_package(element) -> str:
+    return package_name(source_file(element))
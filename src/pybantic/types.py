@@ -1,4 +1,13 @@
-from typing import Any, NewType
+import array
+import base64
+import re
+import types
+import typing
+from datetime import datetime, timedelta
+from typing import Annotated, Any, ClassVar, NewType
+
+from pydantic import BaseModel, GetCoreSchemaHandler, PlainSerializer, PlainValidator
+from pydantic_core import core_schema
 
 # Type Alias
 double = NewType("double", float)
@@ -15,6 +24,92 @@ sfixed64 = NewType("sfixed64", int)
 string = NewType("string", str)
 
 
+def _to_memoryview(value: Any) -> memoryview:
+    if isinstance(value, memoryview):
+        return value
+    if isinstance(value, str):
+        return memoryview(base64.b64decode(value))
+    return memoryview(value)
+
+
+# bytes 字段的零拷贝表示，持有接收到的缓冲区上的 memoryview
+Buffer = Annotated[
+    memoryview,
+    PlainValidator(_to_memoryview),
+    PlainSerializer(lambda value: base64.b64encode(value).decode(), when_used="json"),
+]
+
+
+class _TypedArray(array.array):
+    """定长数值类型的 array.array，对应 packed 的 repeated 标量字段
+
+    浮点数组编码时整体写入原始字节；整数数组的 varint 编码需要逐个元素转换。
+    """
+
+    typecode_: ClassVar[str]
+
+    def __new__(cls, values: Any = ()):
+        if isinstance(values, (bytes, bytearray, memoryview)):
+            instance = super().__new__(cls, cls.typecode_)
+            instance.frombytes(values)
+            return instance
+        return super().__new__(cls, cls.typecode_, values)
+
+    def __reduce_ex__(self, protocol):
+        return self.__class__, (self.tobytes(),)
+
+    @classmethod
+    def _validate(cls, value: Any) -> "_TypedArray":
+        if isinstance(value, cls):
+            return value
+        return cls(value)
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls._validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda value: value.tolist(), when_used="json"
+            ),
+        )
+
+
+class Float32Array(_TypedArray):
+    typecode_ = "f"
+
+
+class Float64Array(_TypedArray):
+    typecode_ = "d"
+
+
+class Int32Array(_TypedArray):
+    typecode_ = "i"
+
+
+class Int64Array(_TypedArray):
+    typecode_ = "q"
+
+
+class UInt32Array(_TypedArray):
+    typecode_ = "I"
+
+
+class UInt64Array(_TypedArray):
+    typecode_ = "Q"
+
+
+ARRAY_TYPE_PY_TO_PB: dict[Any, str] = {
+    Float32Array: "float",
+    Float64Array: "double",
+    Int32Array: "int32",
+    Int64Array: "int64",
+    UInt32Array: "uint32",
+    UInt64Array: "uint64",
+}
+
+
 SCALAR_TYPE_PY_TO_PB: dict[Any, str] = {
     # built-in types
     float: "float",
@@ -22,6 +117,7 @@ SCALAR_TYPE_PY_TO_PB: dict[Any, str] = {
     bool: "bool",
     str: "string",
     bytes: "bytes",
+    memoryview: "bytes",
     # alias types
     double: "double",
     int32: "int32",
@@ -37,6 +133,44 @@ SCALAR_TYPE_PY_TO_PB: dict[Any, str] = {
     string: "string",
 }
 
+
+class FieldMask(BaseModel):
+    """google.protobuf.FieldMask，paths 中的路径以 "." 分隔嵌套字段"""
+
+    paths: list[str] = []
+
+
+# well-known 类型：(proto 中的类型名, 需要导入的 proto 文件)
+WELL_KNOWN_TYPE_PY_TO_PB: dict[Any, tuple[str, str]] = {
+    datetime: ("google.protobuf.Timestamp", "google/protobuf/timestamp.proto"),
+    timedelta: ("google.protobuf.Duration", "google/protobuf/duration.proto"),
+    dict[str, Any]: ("google.protobuf.Struct", "google/protobuf/struct.proto"),
+    FieldMask: ("google.protobuf.FieldMask", "google/protobuf/field_mask.proto"),
+}
+
+WRAPPER_TYPE_PY_TO_PB: dict[Any, str] = {
+    float: "google.protobuf.FloatValue",
+    int: "google.protobuf.Int32Value",
+    bool: "google.protobuf.BoolValue",
+    str: "google.protobuf.StringValue",
+    bytes: "google.protobuf.BytesValue",
+    double: "google.protobuf.DoubleValue",
+    int32: "google.protobuf.Int32Value",
+    int64: "google.protobuf.Int64Value",
+    uint32: "google.protobuf.UInt32Value",
+    uint64: "google.protobuf.UInt64Value",
+    sint32: "google.protobuf.Int32Value",
+    sint64: "google.protobuf.Int64Value",
+    fixed32: "google.protobuf.UInt32Value",
+    fixed64: "google.protobuf.UInt64Value",
+    sfixed32: "google.protobuf.Int32Value",
+    sfixed64: "google.protobuf.Int64Value",
+    string: "google.protobuf.StringValue",
+}
+
+WRAPPER_IMPORT = "google/protobuf/wrappers.proto"
+
+
 SCALAR_TYPE_PB_TO_PY: dict[str, Any] = {
     "double": float,
     "float": float,
@@ -64,6 +198,14 @@ def is_scalar_type(type: Any) -> bool:
     return type in SCALAR_TYPE_PY_TO_PB
 
 
+def get_array_type(type: Any) -> str:
+    return ARRAY_TYPE_PY_TO_PB[type]
+
+
+def is_array_type(type: Any) -> bool:
+    return type in ARRAY_TYPE_PY_TO_PB
+
+
 def is_map_key_type(type: Any) -> bool:
     return type in SCALAR_TYPE_PY_TO_PB and type not in [
         float,
@@ -90,10 +232,81 @@ def is_map_type(key_type: Any, value_type: Any) -> bool:
     return is_map_key_type(key_type) and is_map_value_type(value_type)
 
 
+def get_optional_type(type: Any) -> Any:
+    """Optional[X] 和 X | None 返回 X，其他类型返回 None"""
+    if typing.get_origin(type) not in (typing.Union, types.UnionType):
+        return None
+    args = typing.get_args(type)
+    if len(args) != 2 or types.NoneType not in args:
+        return None
+    return args[0] if args[1] is types.NoneType else args[1]
+
+
+def is_union_type(type: Any) -> bool:
+    return typing.get_origin(type) in (typing.Union, types.UnionType)
+
+
+def is_oneof_type(type: Any) -> bool:
+    # Optional 的标量使用 wrapper 类型，Optional 的消息和 well-known 类型本身就有
+    # presence，都是普通字段；至少有两个非 None 的分支时才渲染为 oneof
+    return is_union_type(type) and len(get_oneof_types(type)) >= 2
+
+
+def get_oneof_types(type: Any) -> list[Any]:
+    return [arg for arg in typing.get_args(type) if arg is not types.NoneType]
+
+
+def get_oneof_field_name(name: str, type: Any) -> str:
+    """oneof 中每个分支的字段名，由 oneof 的名字和分支的类型组成"""
+    if is_scalar_type(type):
+        suffix = get_scalar_type(type)
+    elif is_well_known_type(type):
+        suffix = get_well_known_type(type)[0].rsplit(".", 1)[-1].lower()
+    else:
+        suffix = re.sub(r"(?<!^)(?=[A-Z])", "_", type.__name__).lower()
+    return f"{name}_{suffix}"
+
+
+def is_wrapper_type(type: Any) -> bool:
+    return get_optional_type(type) in WRAPPER_TYPE_PY_TO_PB
+
+
+def is_struct_type(type: Any) -> bool:
+    return type == dict[str, Any]
+
+
+def is_well_known_type(type: Any) -> bool:
+    return is_wrapper_type(type) or type in WELL_KNOWN_TYPE_PY_TO_PB
+
+
+def get_well_known_type(type: Any) -> tuple[str, str]:
+    if is_wrapper_type(type):
+        return WRAPPER_TYPE_PY_TO_PB[get_optional_type(type)], WRAPPER_IMPORT
+    return WELL_KNOWN_TYPE_PY_TO_PB[type]
+
+
+def is_buffer_type(type: Any) -> bool:
+    return type is memoryview
+
+
+def buffer_to_bytes(buffer: memoryview | bytes) -> bytes:
+    """覆盖整个 bytes 对象的 memoryview 直接返回底层对象，避免复制"""
+    if isinstance(buffer, bytes):
+        # 字段的默认值和 model_construct 的值不经过校验，可能仍是 bytes
+        return buffer
+    if isinstance(buffer.obj, bytes) and buffer.nbytes == len(buffer.obj):
+        return buffer.obj
+    return buffer.tobytes()
+
+
 def is_message_type(type: Any) -> bool:
     return getattr(type, "__pybantic_type__", "") == "message"
 
 
+def is_lite_type(type: Any) -> bool:
+    return getattr(type, "__pybantic_type__", "") == "lite"
+
+
 def is_enum_type(type: Any) -> bool:
     return getattr(type, "__pybantic_type__", "") == "enum"
 
@@ -0,0 +1,17 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def compiled(request, tmp_path_factory):
+    """为测试模块中的 pb 生成并编译 proto，编译结果加入 sys.path"""
+    pytest.importorskip("grpc_tools")
+    pytest.importorskip("jinja2")
+    directory = str(tmp_path_factory.mktemp("proto"))
+    pb = request.module.pb
+    pb.generate(directory)
+    pb.compile(directory)
+    sys.path.insert(0, directory)
+    yield directory
+    sys.path.remove(directory)
@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+from pydantic import BaseModel
+
+from pybantic.batch import Batcher, BatchPolicy
+from pybantic.inprocess import create_inprocess_client
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+
+@pb.message
+class Number(BaseModel):
+    value: int
+
+
+@pb.service
+class MathService:
+    @pb.expose(batch=True)
+    def double(self, request: Number) -> Number:
+        if request.value < 0:
+            raise ValueError("negative")
+        return Number(value=request.value * 2)
+
+
+def test_batcher_fans_out_in_order():
+    sent = []
+
+    def send(requests):
+        sent.append(list(requests))
+        return [request * 10 for request in requests]
+
+    batcher = Batcher(BatchPolicy(max_batch_size=4, max_delay=60), send)
+    futures = [batcher.submit(value) for value in range(8)]
+    assert [future.result(timeout=1) for future in futures] == [
+        value * 10 for value in range(8)
+    ]
+    assert sent == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+
+def test_batcher_sends_after_max_delay():
+    batcher = Batcher(
+        BatchPolicy(max_batch_size=100, max_delay=0.01), lambda requests: requests
+    )
+    assert batcher.submit(1).result(timeout=1) == 1
+    batcher.close()
+
+
+def test_batch_error_reaches_every_caller():
+    def send(requests):
+        raise RuntimeError("batch failed")
+
+    batcher = Batcher(BatchPolicy(max_batch_size=2, max_delay=60), send)
+    futures = [batcher.submit(value) for value in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="batch failed"):
+            future.result(timeout=1)
+
+
+def test_batch_size_mismatch_fails_every_caller():
+    batcher = Batcher(BatchPolicy(max_batch_size=2, max_delay=60), lambda r: r[:1])
+    futures = [batcher.submit(value) for value in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="1 items for 2 requests"):
+            future.result(timeout=1)
+
+
+def test_client_batches_concurrent_calls():
+    client = create_inprocess_client(
+        pb,
+        MathService,
+        batch_policies={"double": BatchPolicy(max_batch_size=8, max_delay=0.05)},
+    )
+    results: dict[int, int] = {}
+
+    def call(value):
+        results[value] = client.double(Number(value=value)).value
+
+    threads = [threading.Thread(target=call, args=(value,)) for value in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {value: value * 2 for value in range(8)}
+    client.close()
+
+
+def test_client_batch_errors_and_options():
+    client = create_inprocess_client(
+        pb,
+        MathService,
+        batch_policies={"double": BatchPolicy(max_batch_size=1, max_delay=0.01)},
+    )
+    with pytest.raises(RuntimeError, match="negative"):
+        client.double(Number(value=-1))
+    assert client.double(Number(value=2), timeout=1).value == 4
+    with pytest.raises(TypeError, match="metadata"):
+        client.double(Number(value=2), metadata=(("k", "v"),))
+    client.close()
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+
+import pytest
+from pydantic import BaseModel
+
+from pybantic.build import (
+    GENERATED_SUFFIXES,
+    MANIFEST_NAME,
+    build,
+    stale_protos,
+    verify_build,
+)
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+
+@pb.message
+class Item(BaseModel):
+    name: str
+
+
+@pytest.fixture
+def build_dir(tmp_path, monkeypatch):
+    pytest.importorskip("grpc_tools")
+    pytest.importorskip("jinja2")
+    # verify_build 会把构建目录加入 sys.path
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    directory = str(tmp_path / "build")
+    build([pb], directory)
+    return directory
+
+
+def test_verify_build_accepts_matching_schema(build_dir):
+    verify_build(pb, build_dir)
+    assert os.path.abspath(build_dir) in sys.path
+    assert os.path.exists(os.path.join(build_dir, "test_build_pb2.py"))
+
+
+def test_verify_build_raises_on_fingerprint_mismatch(build_dir):
+    path = os.path.join(build_dir, MANIFEST_NAME)
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest["packages"]["test_build"]["schema"] = "0" * 64
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(RuntimeError, match="schema of test_build changed"):
+        verify_build(pb, build_dir)
+
+
+def test_verify_build_raises_on_schema_change(build_dir):
+    changed = Pybantic()
+
+    @changed.message
+    class Item(BaseModel):
+        name: str
+        count: int
+
+    with pytest.raises(RuntimeError, match="schema of test_build changed"):
+        verify_build(changed, build_dir)
+
+
+def test_verify_build_requires_manifest(tmp_path):
+    with pytest.raises(RuntimeError, match="run `pybantic build` first"):
+        verify_build(pb, str(tmp_path))
+
+
+def write_proto(directory, name: str, imports=(), generated: bool = True) -> None:
+    lines = ['syntax = "proto3";'] + [f'import "{imported}";' for imported in imports]
+    path = directory / name
+    path.write_text("\n".join(lines) + "\n")
+    if not generated:
+        return
+    for suffix in GENERATED_SUFFIXES:
+        output = directory / (name[: -len(".proto")] + suffix)
+        output.touch()
+        # 生成的文件比 proto 新
+        os.utime(output, ns=(0, path.stat().st_mtime_ns + 1))
+
+
+def test_stale_protos_include_dependents(tmp_path):
+    write_proto(tmp_path, "base.proto")
+    write_proto(tmp_path, "middle.proto", ["base.proto"])
+    write_proto(tmp_path, "top.proto", ["middle.proto", "google/protobuf/empty.proto"])
+    write_proto(tmp_path, "other.proto")
+    assert stale_protos(str(tmp_path)) == []
+
+    stat = os.stat(tmp_path / "base.proto")
+    os.utime(tmp_path / "base.proto", ns=(0, stat.st_mtime_ns + 10))
+    assert stale_protos(str(tmp_path)) == ["base.proto", "middle.proto", "top.proto"]
+
+
+def test_stale_protos_missing_output(tmp_path):
+    write_proto(tmp_path, "base.proto")
+    write_proto(tmp_path, "middle.proto", ["base.proto"])
+    write_proto(tmp_path, "new.proto", ["middle.proto"], generated=False)
+    assert stale_protos(str(tmp_path)) == ["new.proto"]
+    os.remove(tmp_path / "middle_pb2_grpc.py")
+    assert stale_protos(str(tmp_path)) == ["middle.proto", "new.proto"]
@@ -0,0 +1,64 @@
+import os
+import time
+
+from pybantic.capture import (
+    RECORD,
+    CapturePolicy,
+    CaptureWriter,
+    capture_files,
+    read_capture,
+)
+
+
+def records(path: str) -> list[tuple[str, bytes]]:
+    return [(record.method, bytes(record.payload)) for record in read_capture(path)]
+
+
+def test_resume_after_torn_tail(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    policy = CapturePolicy(path=path, sample_rate=1.0, max_bytes=4096)
+    writer = CaptureWriter(policy)
+    writer.append("/svc/A", b"first")
+    writer.append("/svc/B", b"second")
+    writer.close()
+    # 模拟写到一半时进程退出：记录头声明了 100 字节，实际只写了 3 字节
+    with open(path, "ab") as f:
+        f.write(RECORD.pack(time.time(), 100, 6) + b"/svc/C" + b"abc")
+
+    writer = CaptureWriter(policy)
+    writer.append("/svc/D", b"third")
+    writer.close()
+    assert records(path) == [
+        ("/svc/A", b"first"),
+        ("/svc/B", b"second"),
+        ("/svc/D", b"third"),
+    ]
+
+
+def test_rotation_keeps_max_files(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    payload = b"x" * 40
+    # 每个文件放得下两条记录
+    max_bytes = 8 + 2 * (RECORD.size + len("/m") + len(payload))
+    writer = CaptureWriter(
+        CapturePolicy(path=path, sample_rate=1.0, max_bytes=max_bytes, max_files=2)
+    )
+    for index in range(7):
+        writer.append("/m", payload[:-1] + str(index).encode())
+    writer.close()
+
+    files = capture_files(path)
+    assert files == [f"{path}.2", f"{path}.1", path]
+    assert not os.path.exists(f"{path}.3")
+    payloads = [payload for file in files for _, payload in records(file)]
+    # 最早的两条随 path.3 被丢弃
+    assert [payload[-1:] for payload in payloads] == [b"2", b"3", b"4", b"5", b"6"]
+
+
+def test_oversized_record_is_dropped(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(CapturePolicy(path=path, sample_rate=1.0, max_bytes=64))
+    writer.append("/m", b"x" * 64)
+    writer.close()
+    assert writer.dropped == 1
+    assert records(path) == []
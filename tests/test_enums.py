@@ -0,0 +1,72 @@
+from enum import Enum
+
+from pydantic import BaseModel
+
+from pybantic.convert import convert_from_protobuf, convert_to_protobuf
+from pybantic.enums import enum_numbers, member_from_number
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+
+@pb.enum
+class Priority(Enum):
+    HIGH = 30
+    LOW = 10
+    MEDIUM = 20
+
+
+@pb.enum
+class Color(Enum):
+    RED = "red"
+    GREEN = "green"
+
+
+@pb.enum
+class Sparse(Enum):
+    SMALL = 1
+    HUGE = 100000
+
+
+@pb.message
+class Task(BaseModel):
+    priority: Priority = Priority.LOW
+    color: Color = Color.GREEN
+
+
+def test_int_values_are_wire_numbers():
+    assert enum_numbers(Priority) == {
+        Priority.HIGH: 30,
+        Priority.LOW: 10,
+        Priority.MEDIUM: 20,
+    }
+
+
+def test_other_values_are_numbered_by_position():
+    assert enum_numbers(Color) == {Color.RED: 1, Color.GREEN: 2}
+
+
+def test_member_from_number():
+    assert member_from_number(Priority, 20) is Priority.MEDIUM
+    assert member_from_number(Priority, 15) is None
+    assert member_from_number(Priority, -1) is None
+    assert member_from_number(Sparse, 100000) is Sparse.HUGE
+    assert member_from_number(Sparse, 2) is None
+
+
+def test_enum_round_trip_uses_values(compiled):
+    message = convert_to_protobuf(Task(priority=Priority.HIGH, color=Color.RED))
+    assert message.priority == 30
+    assert message.color == 1
+    assert convert_from_protobuf(Task, message) == Task(
+        priority=Priority.HIGH, color=Color.RED
+    )
+
+
+def test_unknown_numbers_decode_to_default(compiled):
+    message = convert_to_protobuf(Task())
+    message.priority = 99
+    message.color = 7
+    task = convert_from_protobuf(Task, message)
+    assert task == Task()
+    assert task.model_fields_set == set()
@@ -0,0 +1,67 @@
+from pydantic import BaseModel
+
+from pybantic.cache import CachePolicy, freeze_model
+from pybantic.inprocess import create_inprocess_client
+from pybantic.main import Pybantic
+from pybantic.types import FieldMask
+
+pb = Pybantic()
+
+
+@pb.message
+class Profile(BaseModel):
+    name: str
+    age: int
+
+
+@pb.message
+class User(BaseModel):
+    id: int
+    name: str
+    profile: Profile
+
+
+@pb.message
+class GetUserRequest(BaseModel):
+    id: int
+    read_mask: FieldMask = FieldMask()
+
+
+@pb.service
+class UserService:
+    @pb.expose(field_mask="read_mask")
+    def get(self, request: GetUserRequest) -> User:
+        return User(id=request.id, name="n", profile=Profile(name="p", age=3))
+
+
+def test_freeze_masked_model():
+    user = User.model_construct(_fields_set={"id"}, id=1)
+    frozen = freeze_model(user)
+    assert frozen.id == 1
+    assert frozen.model_fields_set == {"id"}
+    assert "name" not in frozen.__dict__
+
+
+def test_cached_field_mask_call():
+    client = create_inprocess_client(
+        pb, UserService, cache_policies={"get": CachePolicy()}
+    )
+    request = GetUserRequest(id=1, read_mask=FieldMask(paths=["id", "profile.age"]))
+    first = client.get(request)
+    second = client.get(request)
+    assert second is first
+    assert client.cache_stats["get"].hits == 1
+    assert first.id == 1
+    assert first.model_fields_set == {"id", "profile"}
+    assert "name" not in first.__dict__
+    assert first.profile.age == 3
+    assert "name" not in first.profile.__dict__
+
+
+def test_direct_call_applies_field_mask():
+    client = create_inprocess_client(pb, UserService)
+    response = client.get(GetUserRequest(id=2, read_mask=FieldMask(paths=["name"])))
+    assert response.model_fields_set == {"name"}
+    assert response.name == "n"
+    full = client.get(GetUserRequest(id=2))
+    assert full.model_fields_set == {"id", "name", "profile"}
@@ -0,0 +1,42 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# 生成和编译 proto 才需要的依赖，运行路径上不能导入。安装了 grpcio-tools 时
+# grpc 自己会导入 grpc_tools 包做兼容，所以检查的是 protoc 和 command 模块
+BUILD_MODULES = (
+    "grpc_tools.protoc",
+    "grpc_tools.command",
+    "jinja2",
+    "pybantic.render",
+    "pybantic._templates",
+)
+
+PROBE = """
+import json, sys
+import {module}
+print(json.dumps([name for name in {modules!r} if name in sys.modules]))
+"""
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "pybantic",
+        "pybantic.main",
+        "pybantic.client",
+        "pybantic.convert",
+        "pybantic.inprocess",
+        "pybantic.cli",
+    ],
+)
+def test_runtime_import_skips_build_dependencies(module):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, modules=BUILD_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert json.loads(output) == []
@@ -0,0 +1,63 @@
+import time
+
+import grpc
+import pytest
+from pydantic import BaseModel
+
+from pybantic.inprocess import InProcessChannel, create_inprocess_client
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+
+@pb.message
+class Delay(BaseModel):
+    seconds: float
+
+
+@pb.service
+class SleepService:
+    @pb.expose
+    def sleep(self, request: Delay) -> Delay:
+        if request.seconds < 0:
+            raise ValueError("negative delay")
+        time.sleep(request.seconds)
+        return request
+
+
+@pytest.fixture(params=[False, True], ids=["direct", "serialize"])
+def client(request):
+    if request.param:
+        request.getfixturevalue("compiled")
+    client = create_inprocess_client(pb, SleepService, serialize=request.param)
+    yield client
+    client.close()
+
+
+def status_code(error: RuntimeError) -> grpc.StatusCode:
+    assert isinstance(error.__cause__, grpc.RpcError)
+    return error.__cause__.code()
+
+
+def test_call_returns_response(client):
+    assert client.sleep(Delay(seconds=0.0)) == Delay(seconds=0.0)
+
+
+def test_deadline_exceeded(client):
+    with pytest.raises(RuntimeError) as raised:
+        client.sleep(Delay(seconds=0.5), timeout=0.05)
+    assert status_code(raised.value) == grpc.StatusCode.DEADLINE_EXCEEDED
+
+
+def test_handler_exception_is_internal(client):
+    with pytest.raises(RuntimeError) as raised:
+        client.sleep(Delay(seconds=-1.0))
+    assert status_code(raised.value) == grpc.StatusCode.INTERNAL
+
+
+def test_unknown_method_is_unimplemented(compiled):
+    with InProcessChannel(pb, serialize=True) as channel:
+        call = channel.unary_unary("/missing.Service/Method")
+        with pytest.raises(grpc.RpcError) as raised:
+            call(b"")
+    assert raised.value.code() == grpc.StatusCode.UNIMPLEMENTED
@@ -0,0 +1,46 @@
+from typing import Optional, Union
+
+import pytest
+from pydantic import BaseModel
+
+from pybantic.convert import convert_from_protobuf, convert_to_protobuf
+from pybantic.main import Pybantic
+
+pb = Pybantic()
+
+
+@pb.message
+class Point(BaseModel):
+    x: int = 0
+
+
+@pb.message
+class Variant(BaseModel):
+    value: Optional[Union[int, bool, str, Point]] = None
+
+
+@pytest.mark.parametrize(
+    "value, field",
+    [
+        (0, "value_int32"),
+        (7, "value_int32"),
+        (False, "value_bool"),
+        (True, "value_bool"),
+        ("", "value_string"),
+        ("text", "value_string"),
+        (Point(), "value_point"),
+        (Point(x=3), "value_point"),
+    ],
+)
+def test_oneof_dispatches_on_type(compiled, value, field):
+    message = convert_to_protobuf(Variant(value=value))
+    assert message.WhichOneof("value") == field
+    decoded = convert_from_protobuf(Variant, message).value
+    assert type(decoded) is type(value)
+    assert decoded == value
+
+
+def test_unset_oneof_decodes_to_none(compiled):
+    message = convert_to_protobuf(Variant())
+    assert message.WhichOneof("value") is None
+    assert convert_from_protobuf(Variant, message).value is None
@@ -0,0 +1,61 @@
+import gc
+import threading
+
+import grpc
+from google.protobuf.struct_pb2 import Value
+
+from pybantic.pool import MessagePool, pooled_handler
+
+
+def test_released_message_is_reset_and_reused():
+    pool = MessagePool()
+    message = pool.acquire(Value)
+    message.string_value = "payload"
+    pool.release(message)
+    reused = pool.acquire(Value)
+    assert reused is message
+    assert reused.WhichOneof("kind") is None
+    assert pool.stats.as_dict() == {
+        "allocations": 1,
+        "reuses": 1,
+        "releases": 1,
+        "discards": 0,
+    }
+
+
+def test_release_beyond_maxsize_is_discarded():
+    pool = MessagePool(maxsize=1)
+    first, second = pool.acquire(Value), pool.acquire(Value)
+    pool.release(first)
+    pool.release(second)
+    assert pool.stats.discards == 1
+    assert pool.acquire(Value) is first
+    assert pool.acquire(Value) is not second
+
+
+def test_free_lists_are_per_thread():
+    pool = MessagePool()
+    pool.release(pool.acquire(Value))
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire(Value)))
+    thread.start()
+    thread.join()
+    assert pool.stats.reuses == 0
+    # 结束的线程不再计入统计
+    del thread
+    gc.collect()
+    assert pool.stats.allocations == 1
+
+
+def test_pooled_handler_releases_after_serialize():
+    pool = MessagePool()
+    handler = grpc.unary_unary_rpc_method_handler(
+        lambda request, context: request,
+        response_serializer=Value.SerializeToString,
+    )
+    message = pool.acquire(Value)
+    message.number_value = 1.5
+    payload = pooled_handler(handler, pool).response_serializer(message)
+    assert Value.FromString(payload).number_value == 1.5
+    assert pool.stats.releases == 1
+    assert pool.acquire(Value) is message
@@ -0,0 +1,72 @@
+from enum import Enum
+
+import pytest
+from pydantic import BaseModel
+
+from pybantic.main import Pybantic
+from pybantic.sources import source_file
+
+pb = Pybantic()
+
+
+@pb.message
+class Animal(BaseModel):
+    name: str
+
+
+@pb.enum
+class Size(Enum):
+    SMALL = 1
+    LARGE = 2
+
+
+@pb.service
+class ZooService:
+    @pb.expose
+    def feed(self, request: Animal) -> Animal:
+        return request
+
+
+def test_register_defers_classification():
+    registry = Pybantic()
+    registry.register(Animal)
+    assert registry._pending == [Animal]
+    assert dict(registry._registry) == {}
+    assert registry.registry[source_file(Animal)]["message"] == [Animal]
+    assert registry._pending == []
+
+
+def test_registry_groups_elements_by_file_and_type():
+    elements = pb.registry[__file__]
+    assert elements["message"][:1] == [Animal]
+    assert elements["enum"] == [Size]
+    assert elements["service"] == [ZooService]
+
+
+def test_subclass_defined_after_decorator():
+    resolved = pb.registry[__file__]["message"]
+
+    @pb.message
+    class Dog(Animal):
+        breed: str
+
+    # 已经访问过 registry 之后注册的元素在下一次访问时归类
+    assert Dog not in resolved
+    assert pb.registry[__file__]["message"][-1] is Dog
+    assert Dog.__pybantic_type__ == "message"
+    assert Animal in pb.registry[__file__]["message"]
+
+
+def test_legacy_subclass_defined_after_base():
+    pytest.importorskip("grpc_tools")
+    from pybantic._elements import ElementType, Message, _ElementRegistry
+
+    class Base(Message):
+        name: str
+
+    class Derived(Base):
+        extra: int
+
+    _ElementRegistry._ElementRegistry__resolve_pending_elements()
+    registered = _ElementRegistry._ElementRegistry__registered_elements[__name__]
+    assert registered[ElementType.Message][-2:] == [Base, Derived]
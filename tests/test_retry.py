@@ -0,0 +1,129 @@
+from concurrent.futures import Future
+
+import grpc
+import pytest
+
+from pybantic.inprocess import InProcessRpcError
+from pybantic.retry import (
+    HedgingPolicy,
+    LatencyTracker,
+    RetryBudget,
+    RetryPolicy,
+    RetryStats,
+    call_with_hedging,
+    call_with_retry,
+)
+
+
+def failing(code: grpc.StatusCode, calls: list):
+    def call(**kwargs):
+        calls.append(kwargs)
+        raise InProcessRpcError(code, "failed")
+
+    return call
+
+
+class FakeMultiCallable:
+    """future() 按顺序返回已完成的 Future，None 表示成功"""
+
+    def __init__(self, codes: list) -> None:
+        self.codes = list(codes)
+        self.calls = 0
+
+    def future(self, request, **kwargs) -> Future:
+        self.calls += 1
+        future: Future = Future()
+        code = self.codes.pop(0)
+        if code is None:
+            future.set_result(f"response {self.calls}")
+        else:
+            future.set_exception(InProcessRpcError(code, "failed"))
+        return future
+
+
+def test_retry_budget_depletion_stops_retries():
+    policy = RetryPolicy(max_attempts=10, initial_backoff=0.0)
+    budget = RetryBudget(max_tokens=4)
+    stats = RetryStats()
+    calls = []
+    with pytest.raises(grpc.RpcError):
+        call_with_retry(
+            policy,
+            budget,
+            stats,
+            LatencyTracker(),
+            failing(grpc.StatusCode.UNAVAILABLE, calls),
+        )
+    # 4 -> 3 时还可以重试，3 -> 2 时预算不足
+    assert len(calls) == 2
+    assert budget.tokens == 2
+    assert stats.as_dict()["budget_exhausted"] == 1
+    assert not budget.allow_retry()
+
+
+def test_non_retryable_code_keeps_budget():
+    budget = RetryBudget(max_tokens=4)
+    stats = RetryStats()
+    calls = []
+    with pytest.raises(grpc.RpcError) as raised:
+        call_with_retry(
+            RetryPolicy(initial_backoff=0.0),
+            budget,
+            stats,
+            LatencyTracker(),
+            failing(grpc.StatusCode.INVALID_ARGUMENT, calls),
+        )
+    assert raised.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert len(calls) == 1
+    assert budget.tokens == 4
+    assert stats.retries == 0
+
+
+def test_retry_attempts_share_the_deadline():
+    calls = []
+    with pytest.raises(grpc.RpcError):
+        call_with_retry(
+            RetryPolicy(max_attempts=3, initial_backoff=0.01, jitter=0.0),
+            RetryBudget(),
+            RetryStats(),
+            LatencyTracker(),
+            failing(grpc.StatusCode.UNAVAILABLE, calls),
+            timeout=1.0,
+        )
+    timeouts = [kwargs["timeout"] for kwargs in calls]
+    assert len(timeouts) == 3
+    assert timeouts == sorted(timeouts, reverse=True)
+    assert all(timeout <= 1.0 for timeout in timeouts)
+
+
+def test_hedging_stops_on_fatal_code():
+    multicallable = FakeMultiCallable([grpc.StatusCode.INVALID_ARGUMENT, None])
+    stats = RetryStats()
+    with pytest.raises(grpc.RpcError) as raised:
+        call_with_hedging(
+            HedgingPolicy(max_attempts=3, initial_delay=0.0),
+            RetryBudget(),
+            stats,
+            LatencyTracker(),
+            multicallable,
+            "request",
+        )
+    assert raised.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert multicallable.calls == 1
+    assert stats.hedges == 0
+
+
+def test_hedging_continues_after_non_fatal_code():
+    multicallable = FakeMultiCallable([grpc.StatusCode.UNAVAILABLE, None])
+    stats = RetryStats()
+    response = call_with_hedging(
+        HedgingPolicy(max_attempts=3, initial_delay=0.0),
+        RetryBudget(),
+        stats,
+        LatencyTracker(),
+        multicallable,
+        "request",
+    )
+    assert response == "response 2"
+    assert stats.hedges == 1
+    assert stats.hedge_wins == 1
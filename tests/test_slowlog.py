@@ -0,0 +1,85 @@
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+
+from pybantic import slowlog
+from pybantic.hooks import CallInfo
+from pybantic.slowlog import (
+    SlowCallPolicy,
+    SlowCallRecorder,
+    admin_handler,
+    query_slow_calls,
+)
+
+
+def finish(recorder: SlowCallRecorder, method: str, elapsed: float) -> None:
+    call = CallInfo("server", method, request=f"request {elapsed}")
+    call.started = time.perf_counter() - elapsed
+    recorder.call_finished(call)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(slowlog.time, "time", lambda: now[0])
+    return now
+
+
+def test_keeps_slowest_per_method(clock):
+    recorder = SlowCallRecorder(SlowCallPolicy(per_method=2))
+    for elapsed in (0.1, 0.5, 0.3, 0.2):
+        finish(recorder, "/svc/A", elapsed)
+    finish(recorder, "/svc/B", 0.05)
+    slowest = recorder.slowest("/svc/A")
+    assert [round(entry.elapsed, 1) for entry in slowest] == [0.5, 0.3]
+    assert slowest[0].request == "'request 0.5'"
+    assert [entry.method for entry in recorder.slowest()] == [
+        "/svc/A",
+        "/svc/A",
+        "/svc/B",
+    ]
+
+
+def test_window_evicts_old_slices(clock):
+    recorder = SlowCallRecorder(SlowCallPolicy(window=60.0, slices=6))
+    finish(recorder, "/svc/A", 0.5)
+    clock[0] += 30
+    finish(recorder, "/svc/A", 0.1)
+    assert len(recorder.slowest("/svc/A")) == 2
+    # 第一个时间片滑出窗口，第二个仍在窗口内
+    clock[0] += 35
+    assert [round(entry.elapsed, 1) for entry in recorder.slowest("/svc/A")] == [0.1]
+    clock[0] += 60
+    assert recorder.slowest("/svc/A") == []
+    # 新时间片开始时清理过期的时间片
+    finish(recorder, "/svc/A", 0.2)
+    assert len(recorder._slices["/svc/A"]) == 1
+
+
+def test_min_seconds_skips_fast_calls():
+    recorder = SlowCallRecorder(SlowCallPolicy(min_seconds=1.0))
+    finish(recorder, "/svc/A", 0.5)
+    assert recorder.slowest() == []
+
+
+def test_admin_rpc_returns_slow_calls():
+    recorder = SlowCallRecorder()
+    finish(recorder, "/svc/A", 0.5)
+    finish(recorder, "/svc/B", 0.2)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    server.add_generic_rpc_handlers((admin_handler(recorder),))
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            assert [entry.method for entry in query_slow_calls(channel)] == [
+                "/svc/A",
+                "/svc/B",
+            ]
+            (entry,) = query_slow_calls(channel, "/svc/B")
+            assert entry.code == "OK"
+            assert entry.request == "'request 0.2'"
+    finally:
+        server.stop(None)